@@ -1,8 +1,20 @@
-from openai import OpenAI
+import httpx
+import hashlib
+import json
+from openai import AsyncOpenAI, APIStatusError, APIConnectionError, APITimeoutError
+import asyncio
 import logging
+import queue
 import datetime
-from config.settings import AI_API, LOG_FILE_PATH, AI_MODEL
-from random import shuffle
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from dataclasses import dataclass, field
+from typing import NamedTuple
+from common import aio
+from database.databaseOps import get_cached_essay, save_cached_essay
+from config.settings import AI_API, LOG_FILE_PATH, AI_MODEL, AI_MAX_IN_FLIGHT, AI_TOKENS_PER_MINUTE, AI_TIMEOUT, AI_CONNECT_TIMEOUT, AI_MAX_CONNECTIONS, AI_RETRY_LIMIT, AI_BACKOFF_BASE, AI_BACKOFF_MAX
+from random import shuffle, uniform
 
 logging.basicConfig(
     filename=LOG_FILE_PATH,
@@ -12,21 +24,107 @@ logging.basicConfig(
 ai_logger = logging.getLogger(__name__)
 
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=AI_API
-)
+# created on the background loop the first time it is needed, its connection pool is shared by every request
+_client = None
 
-def generate_an_essay_with_words(vocab_words, theme=None, length=None, typ="story", level="B2"):
-    now = datetime.datetime.now()
-    shuffle(vocab_words)
-    words_str = ", ".join(vocab_words)
-    if typ not in ["story", "essay", "paragraph"]:
-        typ = "story"
+def _get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            base_url="https://openrouter.ai/api/v1",
+            api_key=AI_API,
+            max_retries=0, # retries are done by _complete
+            timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=AI_MAX_CONNECTIONS, max_keepalive_connections=AI_MAX_CONNECTIONS),
+                timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+            ),
+        )
+    return _client
+
+
+def _retry_after(e: APIStatusError) -> float:
+    """Seconds the server asked us to wait (Retry-After as seconds or an HTTP date), or None."""
+    headers = e.response.headers
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    # exponential backoff with full jitter
+    return uniform(0, min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * 2**attempt))
+
+
+async def _with_retries(request):
+    """Awaits `request()`, retrying timeouts, connection errors, 429s, 5xx and empty answers."""
+    for attempt in range(AI_RETRY_LIMIT):
+        try:
+            return await request()
+        except APIStatusError as e:
+            if e.status_code != 429 and e.status_code < 500:
+                raise
+            delay = _retry_after(e) if e.status_code == 429 else None
+            error = e
+        except (APIConnectionError, APITimeoutError, ValueError) as e: # APITimeoutError is an APIConnectionError, listed for clarity
+            delay = None
+            error = e
+        if attempt == AI_RETRY_LIMIT - 1:
+            raise error
+        delay = _backoff(attempt) if delay is None else min(delay, AI_TIMEOUT) # a huge Retry-After would block the caller
+        ai_logger.warning(f"Error generating essay: {error}, retrying in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
+
+async def _complete(messages) -> str:
+    """Returns the completion text."""
+    async def request():
+        completion = await _get_client().chat.completions.create(model=AI_MODEL, messages=messages)
+        content = completion.choices[0].message.content
+        if not content:
+            raise ValueError("Empty response from AI")
+        return content
+    return await _with_retries(request)
+
+async def _stream(messages):
+    """Yields the completion text piece by piece.
+
+    Only opening the stream is retried, an error after text has been yielded goes to the caller.
+    """
+    stream = await _with_retries(lambda: _get_client().chat.completions.create(model=AI_MODEL, messages=messages, stream=True))
+    empty = True
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            empty = False
+            yield chunk.choices[0].delta.content
+    if empty:
+        raise ValueError("Empty response from AI")
+
+def _word_count(vocab_words, length=None):
     word_count = 1000 if length == "very-long" else 750 if length == "long" else 500 if length == "medium" else 300 if length == "short" else 150 if length == "very-short" else None
     
     if word_count is None:
         word_count = 75 if len(vocab_words) < 5 else len(vocab_words) * 15 if len(vocab_words) < 10 else len(vocab_words) * 12 if len(vocab_words) < 20 else len(vocab_words) * 10 if len(vocab_words) < 30 else len(vocab_words) * 8
+    return word_count
+
+def _essay_messages(vocab_words, theme=None, length=None, typ="story", level="B2"):
+    shuffle(vocab_words)
+    words_str = ", ".join(vocab_words)
+    if typ not in ["story", "essay", "paragraph"]:
+        typ = "story"
+    word_count = _word_count(vocab_words, length)
     
     theme_instruction = f" about {theme}" if theme != '' and theme != None else ""
     
@@ -50,25 +148,182 @@ def generate_an_essay_with_words(vocab_words, theme=None, length=None, typ="stor
     Style should be suitable for markdown format.
     """
 
-    err = 0
     ai_logger.info(f"Generating an essay - Theme: {theme_instruction}, Essay Word Count: {word_count}, Vocab Count: {len(vocab_words)}, Type: {typ}, Level: {level}, Model: {AI_MODEL}")
-    for _ in range(3):
+    return [
+        {"role": "system", "content": system_instruction},
+        {"role": "user", "content": prompt}
+    ]
+
+async def agenerate_an_essay_with_words(vocab_words, theme=None, length=None, typ="story", level="B2"):
+    now = datetime.datetime.now()
+    try:
+        essay = await _complete(_essay_messages(vocab_words, theme=theme, length=length, typ=typ, level=level))
+        ai_logger.info(f"Essay generated in {datetime.datetime.now() - now} seconds. Essay length: {len(essay.split())} words.")
+        return essay
+    except Exception as e:
+        ai_logger.error(f"Essay couldn't generated in {datetime.datetime.now() - now} seconds: {e}")
+        return f"An error occurred: {e}"
+
+
+# --- Batch Generation ---
+@dataclass
+class EssayJob:
+    key: object # returned untouched with the result, e.g. the chat_id
+    words: list[str]
+    options: dict = field(default_factory=dict) # theme, length, typ, level of agenerate_an_essay_with_words
+    fresh: bool = False # skip the essay cache
+
+class EssayResult(NamedTuple):
+    job: EssayJob
+    essay: str
+    seconds: float
+
+
+class TokenBudget:
+    """Token bucket refilled at `tokens_per_minute`, requests wait until their estimate fits.
+
+    Only used from the background loop, so it needs no lock.
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+
+    async def acquire(self, tokens):
+        if self.capacity <= 0: # no budget configured
+            return
+        tokens = min(tokens, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+            await asyncio.sleep((tokens - self.tokens) * 60 / self.capacity)
+
+
+# shared by every caller, so /essay and the daily job together stay within the provider limits
+token_budget = TokenBudget(AI_TOKENS_PER_MINUTE)
+_in_flight = None # asyncio.Semaphore, created on the background loop
+
+def _estimate_tokens(words, length=None):
+    # prompt (~250 tokens of instructions plus the words) and ~1.4 tokens per generated word
+    return 250 + 3 * len(words) + int(_word_count(words, length) * 1.4)
+
+def _get_in_flight() -> asyncio.Semaphore:
+    global _in_flight
+    if _in_flight is None:
+        _in_flight = asyncio.Semaphore(AI_MAX_IN_FLIGHT)
+    return _in_flight
+
+async def _run_job(job):
+    await token_budget.acquire(_estimate_tokens(job.words, job.options.get('length')))
+    async with _get_in_flight():
+        started = time.monotonic()
+        essay = await agenerate_an_essay_with_words(list(job.words), **job.options)
+        return EssayResult(job, essay, time.monotonic() - started)
+
+def essay_cache_key(vocab_words, theme=None, length=None, typ="story", level="B2") -> str:
+    """The same words and options give the same key, whatever their order, case or spacing."""
+    normalized = [
+        sorted({w.strip().lower() for w in vocab_words}),
+        " ".join((theme or "").lower().split()),
+        length or "",
+        typ if typ in ["story", "essay", "paragraph"] else "story",
+        (level or "B2").upper(),
+        AI_MODEL,
+    ]
+    return hashlib.sha256(json.dumps(normalized).encode('utf-8')).hexdigest()
+
+def _is_error(essay) -> bool:
+    return not essay or essay.startswith("An error occurred")
+
+def generate_essays(jobs, max_in_flight=AI_MAX_IN_FLIGHT):
+    """Runs EssayJobs concurrently and yields an EssayResult as soon as each one finishes.
+
+    `jobs` is consumed lazily, at most `max_in_flight` of them are waiting or running at a
+    time. Every request also goes through the process-wide in-flight limit and token budget.
+    Jobs found in the essay cache are answered right away with 0 seconds.
+    """
+    running = {}
+    for job in jobs:
+        if not job.fresh:
+            essay = get_cached_essay(essay_cache_key(job.words, **job.options))
+            if essay:
+                yield EssayResult(job, essay, 0.0)
+                continue
+        running[aio.submit(_run_job(job))] = job
+        if len(running) >= max_in_flight:
+            yield from _collect(running)
+    while running:
+        yield from _collect(running)
+
+def _collect(running):
+    done, _ = wait(running, return_when=FIRST_COMPLETED)
+    for future in done:
+        job = running.pop(future)
+        try:
+            result = future.result()
+        except Exception as e: # agenerate_an_essay_with_words reports its own errors, this is only a safety net
+            ai_logger.error(f"Error in essay job {job.key}: {e}")
+            yield EssayResult(job, f"An error occurred: {e}", 0.0)
+            continue
+        if not _is_error(result.essay):
+            save_cached_essay(essay_cache_key(job.words, **job.options), result.essay, result.seconds)
+        yield result
+
+# --- Streaming ---
+_END = object()
+
+async def astream_essay(vocab_words, theme=None, length=None, typ="story", level="B2"):
+    """Yields the essay piece by piece as the model writes it, within the in-flight limit and token budget."""
+    await token_budget.acquire(_estimate_tokens(vocab_words, length))
+    async with _get_in_flight():
+        now = datetime.datetime.now()
+        first = None
+        chars = 0
         try:
-            completion = client.chat.completions.create(
-                model=AI_MODEL,
-                messages=[
-                    {"role": "system", "content": system_instruction},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            essay = completion.choices[0].message.content
-            if essay == "":
-                raise ValueError("Empty response from AI")
-            ai_logger.info(f"Essay generated in {datetime.datetime.now() - now} seconds. Essay length: {len(essay.split())} words.")
-            return essay
+            async for piece in _stream(_essay_messages(vocab_words, theme=theme, length=length, typ=typ, level=level)):
+                if first is None:
+                    first = datetime.datetime.now() - now
+                chars += len(piece)
+                yield piece
         except Exception as e:
-            if err == 2: 
-                ai_logger.error(f"Essay couldn't generated in {datetime.datetime.now() - now} seconds")
-                return f"An error occurred: {e}"
-            err += 1
-            ai_logger.warning(f"Error generating essay: {e}, retrying...")
\ No newline at end of file
+            ai_logger.error(f"Essay stream failed after {datetime.datetime.now() - now} seconds: {e}")
+            raise
+        ai_logger.info(f"Essay streamed in {datetime.datetime.now() - now} seconds, first text after {first} seconds. Essay length: {chars} characters.")
+
+def stream_essay(vocab_words, fresh=False, **options):
+    """Sync generator over astream_essay for the handler threads. Raises if the stream fails.
+
+    A cached essay is yielded in one piece, a completely streamed one is added to the cache.
+    """
+    cache_key = essay_cache_key(vocab_words, **options)
+    if not fresh:
+        essay = get_cached_essay(cache_key)
+        if essay:
+            yield essay
+            return
+
+    pieces = queue.Queue()
+
+    async def pump():
+        try:
+            async for piece in astream_essay(list(vocab_words), **options):
+                pieces.put(piece)
+        finally:
+            pieces.put(_END)
+
+    started = time.monotonic()
+    streamed = []
+    future = aio.submit(pump())
+    try:
+        while (piece := pieces.get()) is not _END:
+            streamed.append(piece)
+            yield piece
+        future.result()
+    finally:
+        future.cancel() # the caller stopped reading, don't keep the request open
+    save_cached_essay(cache_key, "".join(streamed), time.monotonic() - started)
@@ -0,0 +1,73 @@
+"""Compares the wall time of essay audio synthesis: one gTTS call vs. parallel sentence segments.
+
+gTTS is replaced by a local stub that sleeps like the real service does: one request per
+100-character token, fetched one after another. Nothing is sent to Google.
+
+    python benchmarks/essay_tts_bench.py [--words 1000] [--latency 0.15] [--runs 3]
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AI_MODEL", "benchmark")
+os.environ.setdefault("AUDIO_CACHE_DIR", tempfile.mkdtemp(prefix="essay-tts-bench-"))
+
+import bot.tts as tts
+import bot.utils as utils
+
+
+class StubTTS:
+    latency = 0.15 # seconds per 100-character request
+
+    def __init__(self, text, lang='en', slow=False):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        for _ in range(math.ceil(len(self.text) / 100)):
+            time.sleep(self.latency)
+            fp.write(b'\xff\xfb\x90\x00' + b'\x00' * 413) # one silent MP3 frame per request
+
+
+def make_essay(words: int) -> str:
+    sentence = "The diligent student reviewed every unfamiliar word before the exam began."
+    per_sentence = len(sentence.split())
+    return ' '.join([sentence] * max(1, words // per_sentence))
+
+
+def bench(label, fn, text, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        audio = fn(text, False, 'en')
+        timings.append(time.perf_counter() - started)
+    print(f"{label:<28} best {min(timings):6.2f}s   mean {sum(timings) / len(timings):6.2f}s   {len(audio)} bytes")
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--words', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.15)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    StubTTS.latency = args.latency
+    tts.gTTS = StubTTS
+    tts.ROUTES['essay'] = 'gtts' # the stub replaces gTTS, whatever TTS_ESSAY_BACKEND says
+    essay = make_essay(args.words)
+    segments = utils.split_sentences(essay)
+    print(f"{len(essay.split())} words, {len(essay)} chars, {len(segments)} segments, "
+          f"{utils.ESSAY_TTS_WORKERS} workers, {args.latency}s per request\n")
+
+    # the synthesis functions are called directly so the disk cache doesn't hide the second run
+    single = bench("single gTTS call", lambda text, slow, language: tts.synthesize('essay', text, slow, language), essay, args.runs)
+    segmented = bench("parallel sentence segments", utils._segmented_audio, essay, args.runs)
+    print(f"\nspeedup: {single / segmented:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
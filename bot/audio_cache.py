@@ -0,0 +1,123 @@
+from config.settings import LOG_FILE_PATH, AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB
+
+import hashlib
+import logging
+import os
+import threading
+
+logging.basicConfig(
+    filename=LOG_FILE_PATH,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+# Synthesized audio is stored on disk as <sha256 of (backend, lang, slow, text)>.mp3, so the same
+# text is only sent to a TTS backend once. Reads refresh a file's mtime and eviction removes the
+# least recently used files once the directory grows past AUDIO_CACHE_MAX_MB.
+
+_lock = threading.Lock()
+_size = None # bytes on disk, scanned on first use
+_stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+
+def audio_key(text: str, language: str, slow: bool, backend: str = 'gtts') -> str:
+    return hashlib.sha256(f"{backend}\0{language}\0{int(bool(slow))}\0{text}".encode('utf-8')).hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(AUDIO_CACHE_DIR, key[:2], f"{key}.mp3")
+
+
+def _scan() -> int:
+    total = 0
+    for root, _, files in os.walk(AUDIO_CACHE_DIR):
+        for name in files:
+            if not name.endswith('.mp3'): # in-flight .tmp files are counted once put renames them
+                continue
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def contains(key: str) -> bool:
+    return os.path.exists(_path(key))
+
+
+def get(key: str) -> bytes:
+    path = _path(key)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)
+    except OSError:
+        with _lock:
+            _stats['misses'] += 1
+        return None
+    with _lock:
+        _stats['hits'] += 1
+    return data
+
+
+def put(key: str, data: bytes) -> None:
+    global _size
+    path = _path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with _lock:
+            if _size is None:
+                _size = _scan()
+            _size += len(data)
+            if os.path.exists(path):
+                _size -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            if _size > AUDIO_CACHE_MAX_MB * 1024 * 1024:
+                _evict()
+    except OSError as e:
+        logger.error(f"Error writing audio cache entry {key}: {e}")
+
+
+def _evict() -> None:
+    """Deletes the least recently used files until the cache is back under 90% of its limit."""
+    global _size
+    entries = []
+    for root, _, files in os.walk(AUDIO_CACHE_DIR):
+        for name in files:
+            if not name.endswith('.mp3'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+
+    target = AUDIO_CACHE_MAX_MB * 1024 * 1024 * 0.9
+    _size = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if _size <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        _size -= size
+        _stats['evicted'] += 1
+    logger.info(f"Audio cache evicted down to {_size / 1024 / 1024:.1f} MB.")
+
+
+def get_stats() -> dict:
+    with _lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return {
+            **_stats,
+            'size_mb': round((_size or 0) / 1024 / 1024, 2),
+            'hit_rate': round(_stats['hits'] / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,48 @@
+from collections import Counter
+from typing import NamedTuple
+
+
+# Users who import the same class list have (nearly) the same due words every day. They are
+# grouped into cohorts that share one essay covering all of their words: identical word sets
+# first, then sets whose Jaccard similarity with a cohort's words reaches `min_jaccard`.
+
+class Cohort(NamedTuple):
+    chat_ids: list[int]
+    words: list[str]
+
+
+def plan_cohorts(assignments, min_jaccard: float, max_words: int) -> list[Cohort]:
+    """Groups (chat_id, words) pairs into cohorts, chats without words are left out.
+
+    A word set joins the most similar cohort as long as the cohort's words stay within
+    `max_words`, so no shared essay gets much longer than one written for a single user.
+    """
+    exact = {}
+    for chat_id, words in assignments:
+        if words:
+            exact.setdefault(frozenset(words), []).append(chat_id)
+
+    clusters = [] # [chat_ids, words]
+    index = {} # word -> indexes of the clusters that contain it
+    # the biggest groups seed the clusters and the smaller ones join them
+    for words, chat_ids in sorted(exact.items(), key=lambda item: (-len(item[1]), -len(item[0]), sorted(item[0]))):
+        best = None
+        if min_jaccard < 1:
+            overlap = Counter(i for word in words for i in index.get(word, ()))
+            candidates = []
+            for i, shared in overlap.items():
+                union = len(words) + len(clusters[i][1]) - shared
+                if union <= max_words:
+                    candidates.append((shared / union, -i))
+            if candidates and max(candidates)[0] >= min_jaccard:
+                best = -max(candidates)[1]
+
+        if best is None:
+            best = len(clusters)
+            clusters.append([[], set()])
+        clusters[best][0].extend(chat_ids)
+        for word in words - clusters[best][1]:
+            index.setdefault(word, []).append(best)
+        clusters[best][1].update(words)
+
+    return [Cohort(chat_ids, sorted(words)) for chat_ids, words in clusters]
@@ -1,8 +1,7 @@
-import scraping.word_scraper as word
 import ai.theAI as theAI
-from database.databaseOps import init_db, get_word_from_db, add_word_to_db, match_user_with_word, get_chat_ids, save_chat_id, delete_chat_id, get_reminder_cycle_of_a_user, change_reminder_cycle_of_a_user, responsible_words, specific_time_word, save_all_messages
+from database.databaseOps import init_db, resolve_word, match_user_with_word, save_chat_id, delete_chat_id, get_reminder_cycle_of_a_user, change_reminder_cycle_of_a_user, MIN_REMINDERS, MAX_REMINDERS, responsible_words, iter_responsible_words, review_word, specific_time_word, save_all_messages, get_turkish_meanings, get_user_words, delete_user_word, get_user_stats, rebuild_user_stats
 
-from config.settings import DB_PATH, LOG_FILE_PATH
+from config.settings import LOG_FILE_PATH, ESSAY_STREAM_EDIT_INTERVAL
 
 ### python-telegram-bot==13.15
 from telegram import Update, ParseMode
@@ -10,14 +9,12 @@ from telegram.ext import CallbackContext
 
 import requests
 import logging
-import sqlite3
-import threading
 import urllib3
 from datetime import datetime, timedelta, timezone, time
-from .utils import pronounce, essay_pronounce, escape_md, send_message_UPDATE, send_message_CONTEXT, edit_message, send_audio_CONTEXT, reply_audio_UPDATE, send_voice_CONTEXT, reply_voice_UPDATE
-
-db_lock = threading.Lock()
-db_path = DB_PATH
+from time import monotonic
+from .utils import pronounce, essay_pronounce, pronunciation_key, essay_key, escape_md, split_text, send_message_UPDATE, edit_message, send_audio_CONTEXT, reply_audio_UPDATE, send_voice_CONTEXT, reply_voice_UPDATE
+from .pipeline import DailyEssayPipeline
+from . import prefetch
 
 logging.basicConfig(
     filename=LOG_FILE_PATH,
@@ -52,17 +49,12 @@ def handle_message(update: Update, context: CallbackContext): # TODO: Check whet
 
     try:
         wrd = message_text.lower().strip()
-        check_db = get_word_from_db(wrd)
-        if check_db == 'NOT IN DATABASE':
-            the_id = add_word_to_db(wrd)
-            if not the_id:
-                send_message_UPDATE(update, parse_mode=None, text="I don't understand what you say!", sender='handle_message')
-                return
-            match_user_with_word(chat_id=chat_id, word_id=the_id[0])
-            word_id, definitions, examples = the_id
-        else:
-            word_id, definitions, examples = check_db
-            match_user_with_word(chat_id=chat_id, word_id=word_id)
+        the_word = resolve_word(wrd)
+        if not the_word:
+            send_message_UPDATE(update, parse_mode=None, text="I don't understand what you say!", sender='handle_message')
+            return
+        word_id, definitions, examples = the_word
+        match_user_with_word(chat_id=chat_id, word_id=word_id)
         
         defs = "\n".join(f"{i+1} {escape_md(defn)}" for i, defn in enumerate(definitions[:3]))
         if len(examples) != 0 and examples[0] != '':
@@ -79,6 +71,7 @@ def handle_message(update: Update, context: CallbackContext): # TODO: Check whet
                 "\n\nThere are no examples available on Cambridge Dictionary for this word\."
             )
         send_message_UPDATE(update, reply_text, parse_mode=ParseMode.MARKDOWN_V2, sender='handle_message')
+        prefetch.enqueue(wrd) # warm /pronounce now that the reply is out
 
     except Exception as e:
         logger.error(f"Error in handle_message: {e}")
@@ -104,11 +97,11 @@ def pronounce_command(update: Update, context: CallbackContext):
     
     word_to_pronounce = word_to_pronounce.strip().lower()
     
-    audio_file = pronounce(word_to_pronounce, slow=slow, language='en')
-    if audio_file:
-        # reply_audio_UPDATE(update, audio=audio_file, title=f"Pronunciation of *{word_to_pronounce}*:")
-        reply_voice_UPDATE(update, voice=audio_file, caption=f"Pronunciation of *{word_to_pronounce}*:", parse_mode=ParseMode.MARKDOWN, sender='pronounce_command')
-    else:
+    # the audio is only synthesized when this word was never sent before
+    msg = reply_voice_UPDATE(update, voice=lambda: pronounce(word_to_pronounce, slow=slow, language='en'),
+                             file_key=pronunciation_key(word_to_pronounce, slow),
+                             caption=f"Pronunciation of *{word_to_pronounce}*:", parse_mode=ParseMode.MARKDOWN, sender='pronounce_command')
+    if msg in ('ERROR', 'UNAUTHORIZED', 'BAD_REQUEST', None):
         send_message_UPDATE(update, f"Could not generate pronunciation for '{word_to_pronounce}'.", sender='pronounce_command')
         logger.error(f"Could not generate pronunciation for '{word_to_pronounce}'.")
 
@@ -124,15 +117,11 @@ def define_command(update: Update, context: CallbackContext):
     for theWord in context.args:
         try:
             wrd = theWord.lower().strip()
-            check_db = get_word_from_db(wrd)
-            if check_db == 'NOT IN DATABASE':
-                the_id = add_word_to_db(wrd)
-                if not the_id: 
-                    send_message_UPDATE(update, parse_mode=None, text="I don't understand what you say!", sender='define_command')
-                    return
-                word_id, definitions, examples = the_id
-            else:
-                word_id, definitions, examples = check_db
+            the_word = resolve_word(wrd)
+            if not the_word: 
+                send_message_UPDATE(update, parse_mode=None, text="I don't understand what you say!", sender='define_command')
+                return
+            word_id, definitions, examples = the_word
             
             defs = "\n".join(f"{i+1} {escape_md(defn)}" for i, defn in enumerate(definitions[:3]))
             if len(examples) != 0 and examples[0] != '':
@@ -149,22 +138,7 @@ def define_command(update: Update, context: CallbackContext):
                     "\n\nThere are no examples available on Cambridge Dictionary for this word\."
                 )
 
-            text = []
-            char_limit = 4000
-            if len(reply_text) > char_limit:
-                cb = 0
-                ca = 0
-                for i in range(0, len(reply_text), char_limit):
-                    if i+cb+char_limit > len(reply_text):
-                        text.append(reply_text[i+cb:])
-                        break
-                    while reply_text[i+ca+char_limit] != ' ':
-                        ca += 1
-                    text.append(reply_text[i+cb:i+ca+char_limit])
-                    cb = ca
-                    ca = 0
-            else:
-                text = [reply_text]
+            text = split_text(reply_text)
 
             for rply in text:
                 send_message_UPDATE(update, rply, parse_mode=ParseMode.MARKDOWN_V2, sender='define_command')
@@ -193,7 +167,6 @@ def get_words_command(update: Update, context: CallbackContext) -> list[str]:
 
     chat_id = update.effective_chat.id
 
-    time_condition = ""
     now = datetime.now(timezone.utc)
 
     if period == "today":
@@ -201,48 +174,13 @@ def get_words_command(update: Update, context: CallbackContext) -> list[str]:
             start_of_day = now - timedelta(hours=12)
         else:
             start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        time_condition = "AND uw.created_at >= ?"
-        time_params = [start_of_day]
+        words = get_user_words(chat_id, since=start_of_day)
     elif period == "this_week":
-        start_time = now - timedelta(days=7)
-        time_condition = "AND uw.created_at >= ?"
-        time_params = [start_time]
+        words = get_user_words(chat_id, since=now - timedelta(days=7))
     elif period == "responsibility":
-        reminders = get_reminder_cycle_of_a_user(chat_id)
-        if reminders is None:
-            send_message_UPDATE(update, "You don't have any reminders set.", parse_mode=None, sender='get_words_command')
-            return
-        valid_dates = [(now - timedelta(days=reminder)).date() for reminder in reminders]
-        placeholders = ', '.join(['?'] * len(valid_dates))
-        time_condition = f"AND DATE(uw.created_at) IN ({placeholders})"
-        time_params = valid_dates
+        words = responsible_words(chat_id)
     else:
-        time_params = []
-
-    try:
-        with db_lock:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            query = f'''
-                SELECT w.word FROM words w
-                JOIN user_words uw ON w.id = uw.word_id
-                WHERE uw.chat_id = ? {time_condition}
-            '''
-            cursor.execute(query, [chat_id] + time_params)
-            result = cursor.fetchall()
-            conn.close()
-
-        if result:
-            words = [row[0] for row in result]
-        else:
-            logger.warning(f"No words found for chat ID {chat_id} (period: {period}).")
-            words = []
-    except sqlite3.Error as e: 
-        logger.error(f"SQLite error: {e}")
-        words = []
-    except Exception as e:
-        logger.error(f"Error retrieving user words by command ({chat_id}, {period}): {e}")
-        words = []
+        words = get_user_words(chat_id)
 
     if words:
         words_text = "\n".join(f"{i+1}. {word}" for i, word in enumerate(words))
@@ -250,13 +188,14 @@ def get_words_command(update: Update, context: CallbackContext) -> list[str]:
             "all": "all time",
             "today": "today",
             "this_week": "this week",
-            "responsibility": "your responsibility dates"
+            "responsibility": "review today"
         }
         send_message_UPDATE(update,
             f"Here are your words ({len(words)}) for {dct[period]}:\n\n{words_text}",
             parse_mode=None, sender='get_words_command'
         )
     else:
+        logger.warning(f"No words found for chat ID {chat_id} (period: {period}).")
         send_message_UPDATE(update,
             f"You don't have any words in your vocabulary yet. "
             f"Please send me a word to start learning!",
@@ -273,30 +212,35 @@ def get_reminder_command(update: Update, context: CallbackContext) -> None:
         logger.warning(f"No reminders found for chat ID {chat_id}.")
         return
 
+    def ordinal(n):
+        return f"{n}{'th' if 10 <= n % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')}"
+
+    lines = [
+        f"""{ordinal(i+1)} reminder: {'Today' if days == 0 else f"{days} day{'s' if days > 1 else ''} ago"}"""
+        for i, days in enumerate(reminders)
+    ]
     reminder_text = (
-        f"Your reminder cycle:\n"
-        f"""1st reminder: {'Today' if reminders[0] == 0 else f"{reminders[0]} day{'s' if reminders[0]>1 else ''}"}\n"""
-        f"2nd reminder: {reminders[1]} day{'s' if reminders[1] > 1 else ''} ago\n"
-        f"3rd reminder: {reminders[2]} days ago\n"
-        f"4th reminder: {reminders[3]} days ago\n"
-        f"5th reminder: {reminders[4]} days ago\n"
-        f"\nYou can change your reminder cycle with /set_reminders command."
+        "Your reminder cycle:\n"
+        + "\n".join(lines) +
+        "\n\nYou can change your reminder cycle with /set_reminders command."
     )
     send_message_UPDATE(update, reminder_text, parse_mode=None, sender='get_reminder_command')
     logger.info(f"Reminder command executed for chat ID {chat_id}.")
 
-def set_reminder_command(update: Update, context: CallbackContext) -> None: # TODO: Add feature of adding more and less reminders
+def set_reminder_command(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
-    if len(context.args) != 5:
-        send_message_UPDATE(update, "Please provide 5 reminder intervals in days like the example:\n/set_reminders 1 2 4 8 16", parse_mode=None, sender='set_reminder_command')
+    if not MIN_REMINDERS <= len(context.args) <= MAX_REMINDERS:
+        send_message_UPDATE(update, f"Please provide {MIN_REMINDERS} to {MAX_REMINDERS} reminder intervals in days like the example:\n/set_reminders 0 1 3 6 14 30", parse_mode=None, sender='set_reminder_command')
         return
 
     try:
         reminders = [int(arg) for arg in context.args]
         if any(reminder < 0 for reminder in reminders):
             raise ValueError("Reminder intervals must be non-negative.")
+        if len(set(reminders)) != len(reminders):
+            raise ValueError("Reminder intervals must be different from each other.")
 
-        if change_reminder_cycle_of_a_user(chat_id, *reminders):
+        if change_reminder_cycle_of_a_user(chat_id, reminders):
             send_message_UPDATE(update, parse_mode=None, sender='set_reminder_command', text=f"Your reminder cycle has been updated successfully.")
             logger.info(f"Reminder cycle updated for chat ID {chat_id}.")
         else:
@@ -342,15 +286,6 @@ def stats_command(update: Update, context: CallbackContext):
     chat_id = update.effective_chat.id
     user_name = update.effective_user.first_name
     try:
-        with db_lock:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute('''SELECT created_at FROM user_words WHERE chat_id = ?''', (chat_id,))
-            all_words = cursor.fetchall()
-            conn.close()
-
-        all_dates = [datetime.strptime(t[0], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc) for t in all_words]
-        responsibility_sum = len(responsible_words(chat_id))
         now = datetime.now(timezone.utc)
         if now.hour < 9:
             start_of_day = now - timedelta(hours=12)
@@ -359,38 +294,62 @@ def stats_command(update: Update, context: CallbackContext):
         
         start_week = now - timedelta(days=7)
         
-        today_sum = 0
-        this_week_sum = 0
-        for date in all_dates:
-            if date >= start_of_day:
-                today_sum += 1
-            if date >= start_week:
-                this_week_sum += 1
-
-        all_days = [date.date() for date in all_dates]
-        streak = 0
-        while streak < len(all_dates) and (now.date() - timedelta(days=streak)) in all_days:
-            streak += 1
+        stats = get_user_stats(chat_id, start_of_day, start_week)
+        if stats is None:
+            raise ValueError("stats could not be read")
+        total = stats['total']
+        today_sum = stats['today']
+        this_week_sum = stats['this_week']
+        streak = stats['streak']
+        responsibility_sum = len(responsible_words(chat_id))
 
         text = (
             f"Hello {user_name}! 👋\n"
             f"Here are your stats:\n\n"
-            f"You have added a total of <b>{len(all_dates)}</b>{'❤️‍🔥' if len(all_dates) >= 5 else ''} words to your vocabulary.\n"
-            f"{today_sum if today_sum < len(all_dates) else 'All'} of them are added today. /today\n"
-            f"{this_week_sum if this_week_sum < len(all_dates) else 'All'} of them are added this week. /this_week\n"
-            f"{responsibility_sum if responsibility_sum < len(all_dates) else 'All'} of them are your responsibility for today. /responsibility"
+            f"You have added a total of <b>{total}</b>{'❤️‍🔥' if total >= 5 else ''} words to your vocabulary.\n"
+            f"{today_sum if today_sum < total else 'All'} of them are added today. /today\n"
+            f"{this_week_sum if this_week_sum < total else 'All'} of them are added this week. /this_week\n"
+            f"{responsibility_sum if responsibility_sum < total else 'All'} of them are your responsibility for today. /responsibility"
             f"\n\nYour current streak is <b>{streak}</b>{'💀' if streak >= 10 else '🔥' if streak >=5 else '😎' if streak >= 3 else ''} day{'s' if streak >= 2 else ''}.\n"
+            f"Your longest streak is <b>{stats['longest_streak']}</b> day{'s' if stats['longest_streak'] >= 2 else ''}.\n"
             f"\n\nYou can view your words with /words command.\n")            
 
         send_message_UPDATE(update, sender='stats_command', text=text, parse_mode=ParseMode.HTML)
         logger.info(f"Stats command executed for chat ID {chat_id}.")
-    except sqlite3.Error as e:
-        logger.error(f"SQLite error: {e}")
-        send_message_UPDATE(update, parse_mode=None, sender='stats_command', text="An error occurred while retrieving stats.")
     except Exception as e:
         logger.error(f"Error in stats command ({chat_id}): {e}")
         send_message_UPDATE(update, parse_mode=None, sender='stats_command', text="An error occurred while retrieving stats.")
 
+def rebuild_stats_command(update: Update, context: CallbackContext):
+    chat_id = update.effective_chat.id
+    if rebuild_user_stats(chat_id):
+        send_message_UPDATE(update, parse_mode=None, sender='rebuild_stats_command', text="Your stats have been recalculated. /stats")
+        logger.info(f"Stats rebuilt for chat ID {chat_id}.")
+    else:
+        send_message_UPDATE(update, parse_mode=None, sender='rebuild_stats_command', text="An error occurred while recalculating your stats.")
+
+def review_command(update: Update, context: CallbackContext):
+    chat_id = update.effective_chat.id
+    usage = "Usage: /review [word] [0-5]\n0 = I forgot it completely, 5 = I knew it instantly."
+    if len(context.args) < 2 or context.args[0] == '-help':
+        send_message_UPDATE(update, parse_mode=None, sender='review_command', text=usage)
+        return
+
+    wrd = ' '.join(context.args[:-1]).lower().strip()
+    try:
+        quality = int(context.args[-1])
+        if not 0 <= quality <= 5:
+            raise ValueError("grade must be between 0 and 5")
+    except ValueError as e:
+        send_message_UPDATE(update, parse_mode=None, sender='review_command', text=f"Invalid grade: {e}\n\n{usage}")
+        return
+
+    if review_word(chat_id, wrd, quality):
+        send_message_UPDATE(update, parse_mode=None, sender='review_command', text=f"Got it! '{wrd}' has been rescheduled.")
+        logger.info(f"Word '{wrd}' reviewed with grade {quality} for chat ID {chat_id}.")
+    else:
+        send_message_UPDATE(update, parse_mode=None, sender='review_command', text=f"The word '{wrd}' was not found in your vocabulary.")
+
 def delete_word(update: Update, context: CallbackContext):
     chat_id = update.effective_chat.id
     if len(context.args) == 0:
@@ -399,24 +358,12 @@ def delete_word(update: Update, context: CallbackContext):
 
     words_to_delete = [arg.lower() for arg in context.args]
     words_deleted = []
-    with db_lock:
-        for word_to_delete in words_to_delete:
-            try:
-                with sqlite3.connect(db_path) as conn:
-                    c = conn.cursor()
-                    c.execute('''DELETE FROM user_words WHERE chat_id = ? AND word_id IN (SELECT id FROM words WHERE word = ?)''', (chat_id, word_to_delete))
-                    conn.commit()
-                    if conn.total_changes > 0: 
-                        words_deleted.append(word_to_delete)
-                    else:
-                        send_message_UPDATE(update, parse_mode=None, sender='delete_word', text=f"The word '{word_to_delete}' was not found in your vocabulary.")
-                        logger.warning(f"Word '{word_to_delete}' not found for chat ID {chat_id}.")
-            except sqlite3.Error as e:
-                logger.error(f"SQLite error: {e}")
-                send_message_UPDATE(update, parse_mode=None, sender='delete_command', text="An error occurred while deleting the word.")
-            except Exception as e:
-                logger.error(f"Error deleting word ({chat_id}, {word_to_delete}): {e}")
-                send_message_UPDATE(update, parse_mode=None, sender='delete_command', text="An error occurred while deleting the word.")
+    for word_to_delete in words_to_delete:
+        if delete_user_word(chat_id, word_to_delete):
+            words_deleted.append(word_to_delete)
+        else:
+            send_message_UPDATE(update, parse_mode=None, sender='delete_word', text=f"The word '{word_to_delete}' was not found in your vocabulary.")
+            logger.warning(f"Word '{word_to_delete}' not found for chat ID {chat_id}.")
     send_message_UPDATE(update, parse_mode=None, sender='delete_command', text=f"The word{'s' if len(words_deleted)>1 else ''} '{', '.join(words_deleted)}' {'have' if len(words_deleted) > 1 else 'has'} been deleted from your vocabulary.")
 
 
@@ -437,10 +384,10 @@ def turkish_meaning_command(update: Update, context: CallbackContext):
             else: send_message_UPDATE(update, parse_mode=None, sender='turkish_meaning_command', text="Invalid option.")
             
         else: words_to_translate.append(arg.lower().strip())
-        # TODO: Check if the word is already in the database
 
+    meanings = get_turkish_meanings(words_to_translate)
     for word_to_translate in words_to_translate:
-        turkish_meaning = word.scrape_turkish_meaning(word_to_translate) 
+        turkish_meaning = meanings.get(word_to_translate)
         if turkish_meaning:
             turkish_meaning_text = "\n".join(f"{i+1}. {t}" for i, t in enumerate(turkish_meaning[:3 if not all_meanings else None]))
             send_message_UPDATE(update, sender='turkish_meaning_command', text=f"*Turkish meaning of {word_to_translate}:*\n{turkish_meaning_text}", parse_mode=ParseMode.MARKDOWN)
@@ -456,6 +403,7 @@ def help_command(update: Update, context: CallbackContext):
         "/start - Start the bot\n"
         "/stop - Stop the bot\n"
         "/stats - View your vocabulary stats\n"
+        "/rebuild\_stats - Recalculate your stats from your words\n"
         "/help - Show this help message\n"
         "`/any_command -help` - Show help for any command\n"
         "/define `[word]` - Get all definitions of a word\n"
@@ -466,9 +414,10 @@ def help_command(update: Update, context: CallbackContext):
         "/today - View words added today\n"
         "/this\_week - View words added this week\n"
         "/responsibility - View words you're responsible for today\n"
+        "/review `[word] [0-5]` - Tell me how well you remembered a word\n"
         "/essay - Generate an essay using your responsible words\n"
         "/reminder - View your reminder cycle\n"
-        "/set\_reminders - Update your reminder cycle\n\n"
+        "/set\_reminders `[days...]` - Update your reminder cycle (2 to 20 intervals)\n\n"
         "💡 *Quick Tip:*\n"
         "You can also send me a word directly to get its definitions and examples.\n"
         "Happy learning! 🎉📚\n"
@@ -479,6 +428,83 @@ def help_command(update: Update, context: CallbackContext):
     logger.info(f"Help command executed for chat ID {update.effective_chat.id}.")
 
 
+def _essay_parts(text: str, char_limit: int = 4000) -> list[str]:
+    # Unlike split_text, a part never changes once the text has grown past it,
+    # so the messages already sent for a streamed essay stay valid.
+    parts = []
+    start = 0
+    while len(text) - start > char_limit:
+        cut = text.rfind(' ', start + 1, start + char_limit)
+        if cut == -1:
+            cut = start + char_limit
+        parts.append(text[start:cut])
+        start = cut
+    parts.append(text[start:])
+    return parts
+
+
+def _show_essay(update, context, messages, shown, essay, parse_mode=None) -> bool:
+    """Brings the essay messages up to date, editing only the parts that changed and sending new ones for the overflow.
+
+    A part Telegram refuses with `parse_mode` is sent as plain text instead. Returns False if a part couldn't be shown.
+    """
+    chat_id = update.effective_chat.id
+    for i, part in enumerate(_essay_parts(essay)):
+        if not part.strip():
+            continue
+        if i == len(messages):
+            msg = send_message_UPDATE(update, parse_mode=parse_mode, sender='send_essay_to_user', text=part)
+            if msg in ('BAD_REQUEST', 'ERROR') and parse_mode is not None: # e.g. unbalanced markdown, send it as it is
+                msg = send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text=part)
+            if isinstance(msg, str):
+                return False
+            messages.append(msg.message_id)
+            shown.append(part)
+        elif part != shown[i] or (parse_mode is not None and any(mark in part for mark in '*_`[')):
+            msg = edit_message(context=context, chat_id=chat_id, message_id=messages[i], text=part, parse_mode=parse_mode)
+            if msg in ('BAD_REQUEST', 'ERROR') and parse_mode is not None and part != shown[i]:
+                msg = edit_message(context=context, chat_id=chat_id, message_id=messages[i], text=part)
+            if not isinstance(msg, str):
+                shown[i] = part
+            elif part != shown[i]:
+                return False
+    return True
+
+
+def stream_essay_UPDATE(update: Update, context: CallbackContext, placeholder_message, pieces) -> str:
+    """Shows the essay in the placeholder while it is being written and returns it, or None if it failed or couldn't be shown.
+
+    The text is edited in as plain text at most once per ESSAY_STREAM_EDIT_INTERVAL seconds, which keeps
+    us under Telegram's edit rate limit, and rolls over to new messages past 4000 characters.
+    When the essay is complete every message is edited once more with Markdown.
+    """
+    messages = [] if isinstance(placeholder_message, str) else [placeholder_message.message_id]
+    shown = ["Generating essay..."] * len(messages)
+    essay = ''
+    last_edit = 0.0
+    try:
+        for piece in pieces:
+            essay += piece
+            if monotonic() - last_edit >= ESSAY_STREAM_EDIT_INTERVAL:
+                _show_essay(update, context, messages, shown, essay)
+                last_edit = monotonic()
+    except Exception as e:
+        logger.error(f"Error while streaming the essay to chat ID {update.effective_chat.id}: {e}")
+        if not essay.strip():
+            if messages:
+                edit_message(context=context, chat_id=update.effective_chat.id, message_id=messages[0], text="Failed to generate an essay. Please try again later.")
+            else:
+                send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text="Failed to generate an essay. Please try again later.")
+            return None
+        _show_essay(update, context, messages, shown, essay + "\n\n(The essay was cut off. Please try again later.)")
+        return None
+
+    if not _show_essay(update, context, messages, shown, essay, parse_mode=ParseMode.MARKDOWN):
+        logger.error(f"Couldn't show the whole essay in chat ID {update.effective_chat.id}.")
+        return None
+    return essay
+
+
 def send_essay_to_user(update: Update, context: CallbackContext) -> None:
     try:
         now = datetime.now(timezone.utc)
@@ -490,8 +516,7 @@ def send_essay_to_user(update: Update, context: CallbackContext) -> None:
 
         if len(context.args) == 0:
             placeholder_message = send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text="Generating essay...")
-            essay = theAI.generate_an_essay_with_words(words)
-            voice_essay = essay
+            pieces = theAI.stream_essay(words)
             slow = False
         else:
             theme = ''
@@ -499,11 +524,12 @@ def send_essay_to_user(update: Update, context: CallbackContext) -> None:
             typ = ''
             level = 'B2'
             slow = False
+            fresh = False
             words_range = 'all'
             for arg in context.args:
                 if arg.startswith('-'):
                     if arg == '-help':
-                        send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text="Usage: /essay [-story | -essay | -paragraph] [-very-short | -short | -medium | -long | -very-long] [-A1 | -A2 | -B1 | -B2 | -C1 | -C2] [-today | -this-week | -all | -responsibility] [theme] \n\nFor example: /essay -story -short a day in the life of a student")
+                        send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text="Usage: /essay [-story | -essay | -paragraph] [-very-short | -short | -medium | -long | -very-long] [-A1 | -A2 | -B1 | -B2 | -C1 | -C2] [-today | -this-week | -all | -responsibility] [-fresh] [theme] \n\nFor example: /essay -story -short a day in the life of a student\n\n-fresh writes a new essay instead of reusing the last one for the same words.")
                         return
                     elif arg.startswith('-') and arg in ['-story', '-essay', '-paragraph']:
                         typ = arg[1:]
@@ -513,6 +539,8 @@ def send_essay_to_user(update: Update, context: CallbackContext) -> None:
                         level = arg[1:].upper()
                     elif arg.startswith('-') and arg in ['-slow', '-s']:
                         slow = True
+                    elif arg == '-fresh':
+                        fresh = True
                     elif arg.startswith('-') and arg in ['-today', '-this-week', '-all', '-responsibility']:
                         words_range = arg[1:]
                         if words_range == 'today':
@@ -520,69 +548,25 @@ def send_essay_to_user(update: Update, context: CallbackContext) -> None:
                         elif words_range == 'this_week':
                             words = specific_time_word(chat_id, date='this_week')
                         elif words_range == 'all':
-                            with db_lock:
-                                conn = sqlite3.connect(db_path)
-                                cursor = conn.cursor()
-                                query = f'''
-                                    SELECT w.word FROM words w
-                                    JOIN user_words uw ON w.id = uw.word_id
-                                    WHERE uw.chat_id = ?
-                                '''
-                                cursor.execute(query, [chat_id])
-                                result = cursor.fetchall()
-                                conn.close()
-                                if result:
-                                    words = [row[0] for row in result]
-                                else:
-                                    send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text="No words found in your vocabulary.")
-                                    return
+                            words = get_user_words(chat_id)
+                            if not words:
+                                send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text="No words found in your vocabulary.")
+                                return
                     else:
                         send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text=f"Unknown argument: {arg}. Use /essay -help for usage.")
                         return
                 else:
                     theme += arg + ' '
             placeholder_message = send_message_UPDATE(update, parse_mode=None, sender='send_essay_to_user', text="Generating essay...")
-            essay = theAI.generate_an_essay_with_words(words, theme=theme.strip(), length=length, typ=typ, level=level)
-            voice_essay = essay
+            pieces = theAI.stream_essay(words, fresh=fresh, theme=theme.strip(), length=length, typ=typ, level=level)
+        essay = stream_essay_UPDATE(update, context, placeholder_message, pieces)
         if not essay:
-            edit_message(
-                context=context,
-                chat_id=update.effective_chat.id,
-                message_id=placeholder_message.message_id,
-                text="Failed to generate an essay. Please try again later.",
-            )
             return
-
-        essays = []
-        char_limit = 4000
-        if len(essay) > char_limit:
-            cb = 0
-            ca = 0
-            for i in range(0, len(essay), char_limit):
-                if i+cb+char_limit > len(essay):
-                    essays.append(essay[i+cb:])
-                    break
-                while essay[i+ca+char_limit] != ' ':
-                    ca += 1
-                essays.append(essay[i+cb:i+ca+char_limit])
-                cb = ca
-                ca = 0
-
-        else:
-            essays = [essay]
-        edit_message(
-            context=context,
-            chat_id=update.effective_chat.id,
-            message_id=placeholder_message.message_id,
-            text=essays[0],
-            parse_mode=ParseMode.MARKDOWN 
-        )
-        for chunk in essays[1:]:
-            send_message_UPDATE(update, sender='send_essay_to_user', text=chunk, parse_mode=ParseMode.MARKDOWN)
+        voice_essay = essay
         
-        voice = essay_pronounce(voice_essay, slow=slow, language='en')
         # send_audio_CONTEXT(context, chat_id=chat_id, audio=voice, title="Here is your essay!")
-        send_voice_CONTEXT(context, chat_id=chat_id, voice=voice, caption="Here is your essay!")
+        send_voice_CONTEXT(context, chat_id=chat_id, voice=lambda: essay_pronounce(voice_essay, slow=slow, language='en'),
+                           file_key=essay_key(voice_essay, slow), caption="Here is your essay!")
         
         logger.info(f"Essay and it's pronunciation are sent to chat ID {chat_id}. It took {datetime.now(timezone.utc) - now} seconds.")
     except Exception as e:
@@ -594,57 +578,10 @@ def send_essay_to_user(update: Update, context: CallbackContext) -> None:
 
 def send_daily_essays(context: CallbackContext) -> None:
     logger.info("Sending daily essays...")
-    chat_ids = get_chat_ids()
-    if len(chat_ids) == 0:
-        logger.info("No chat IDs found in the database.")
-        return
-
-    for chat_id in chat_ids:
-        logger.info(f"Sending daily essay to chat ID {chat_id}...")
-        try:
-            words = responsible_words(chat_id)
-            if not words:
-                continue
-
-            essay = theAI.generate_an_essay_with_words(words) # TODO: make it async
-            voice_essay = essay
-            parts = essay.split('**')
-            for i in range(1, len(parts), 2):
-                parts[i] = f'<b>{parts[i]}</b>'
-            essay = ''.join(parts)
-            if not essay:
-                logger.warning(f"Failed to generate essay for chat ID {chat_id}.")
-                continue
-        
-            essay = '<b>Your daily essay:</b>\n\n' + essay
-            essays = []
-            char_limit = 4000
-            if len(essay) > char_limit:
-                cb = 0
-                ca = 0
-                for i in range(0, len(essay), char_limit):
-                    if i+cb+char_limit > len(essay):
-                        essays.append(essay[i+cb:])
-                        break
-                    while essay[i+ca+char_limit] != ' ':
-                        ca += 1
-                    essays.append(essay[i+cb:i+ca+char_limit])
-                    cb = ca
-                    ca = 0
-            else:
-                essays = [essay]
-
-            for chunk in essays:
-                send_message_CONTEXT(context, chat_id=chat_id, text=chunk, parse_mode=ParseMode.HTML) # FIXME: Convert this to markdown v2
-            
-            voice = essay_pronounce(voice_essay, slow=False, language='en')
-            # send_audio_CONTEXT(context, chat_id=chat_id, audio=voice, title="Here is your essay!")
-            send_voice_CONTEXT(context, chat_id=chat_id, voice=voice, caption="Here is your essay!")
-
-        except Exception as e:
-            logger.error(f"Error sending daily essay to chat ID {chat_id}: {e}")
-            continue
-        logger.info(f"Daily essay sent to chat ID {chat_id}.")
+    summary = DailyEssayPipeline(context).run(iter_responsible_words())
+    if summary['chats'] == 0:
+        logger.info("No responsible words found for any chat ID.")
+    logger.info(f"Daily essays finished: {summary}")
 
 
 def test(update: Update, context: CallbackContext): # TODO: remove this function
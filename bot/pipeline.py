@@ -0,0 +1,229 @@
+import ai.theAI as theAI
+from database.databaseOps import record_reviews, get_voice_file_id, get_essay_cache_stats, get_word_cache_stats
+from database.connection import close_finished_connections
+from config.settings import LOG_FILE_PATH, DAILY_ESSAY_LLM_WORKERS, DAILY_ESSAY_TTS_WORKERS, DAILY_ESSAY_SEND_WORKERS, DAILY_ESSAY_COHORT_JACCARD, DAILY_ESSAY_COHORT_MAX_WORDS
+
+from telegram import ParseMode
+from telegram.ext import CallbackContext
+
+import logging
+import threading
+import time
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from . import tts
+from .cohorts import plan_cohorts
+from .utils import essay_pronounce, essay_key, split_text, send_message_CONTEXT, send_voice_CONTEXT
+
+logging.basicConfig(
+    filename=LOG_FILE_PATH,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+class DailyEssayPipeline:
+    """Delivers daily essays through theAI's batch scheduler and two bounded worker pools.
+
+    Chats with similar words are planned into cohorts that share one essay. Every cohort
+    goes through LLM generation, then its text is sent to each member while the audio is
+    synthesized once in parallel, and the voice is sent once both are done. Once the text
+    is delivered, the member's own words are rescheduled as a passive review.
+    """
+
+    def __init__(self, context: CallbackContext, llm_workers=DAILY_ESSAY_LLM_WORKERS, tts_workers=DAILY_ESSAY_TTS_WORKERS, send_workers=DAILY_ESSAY_SEND_WORKERS):
+        self.context = context
+        self.llm_workers = llm_workers
+        self.tts_pool = ThreadPoolExecutor(max_workers=tts_workers, thread_name_prefix='essay-tts')
+        self.send_pool = ThreadPoolExecutor(max_workers=send_workers, thread_name_prefix='essay-send')
+
+        self.lock = threading.Lock()
+        self.all_done = threading.Condition(self.lock)
+        self.pending = 0
+        self.words = {}
+        self.essays = {}
+        self.cohorts = {}
+        self.upload_locks = {}
+        self.stats = {
+            'chats': 0, 'cohorts': 0, 'skipped': 0, 'delivered': 0,
+            'llm_failed': 0, 'tts_failed': 0, 'send_failed': 0,
+        }
+        self.stage_seconds = {'llm': 0.0, 'tts': 0.0, 'send': 0.0}
+
+    def run(self, assignments) -> dict:
+        """Plans cohorts from the (chat_id, words) pairs, delivers their essays and returns the run summary."""
+        started = time.monotonic()
+        assignments = list(assignments) # cohorts need every chat's words up front
+        cohorts = plan_cohorts(assignments, DAILY_ESSAY_COHORT_JACCARD, DAILY_ESSAY_COHORT_MAX_WORDS)
+        logger.info(f"Planned {len(cohorts)} daily essays for {sum(len(cohort.chat_ids) for cohort in cohorts)} chats.")
+        with self.lock:
+            self.pending = 1 # held until every job is submitted
+        try:
+            # essays come back in completion order while later jobs are still being submitted
+            for result in theAI.generate_essays(self._jobs(assignments, cohorts), max_in_flight=self.llm_workers):
+                with self.lock:
+                    self.stage_seconds['llm'] += result.seconds
+                try:
+                    self._after_generate(result.job.key, result.essay)
+                except Exception as e:
+                    logger.error(f"Daily essay pipeline error for cohort {result.job.key}: {e}")
+                    for chat_id in self.cohorts[result.job.key]:
+                        self._finish(chat_id, 'send_failed')
+        finally:
+            with self.all_done:
+                self.pending -= 1
+                if self.pending == 0:
+                    self.all_done.notify_all()
+
+        with self.all_done:
+            while self.pending > 0:
+                self.all_done.wait()
+
+        for pool in (self.tts_pool, self.send_pool):
+            pool.shutdown(wait=True)
+        close_finished_connections() # the pools' threads are gone, their connections would stay open until collected
+        return self._summary(time.monotonic() - started)
+
+    def _timed(self, stage, fn, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.stage_seconds[stage] += time.monotonic() - started
+
+    def _guarded(self, chat_id, callback):
+        # an exception escaping a done-callback is swallowed by the executor, so the run would never finish
+        def wrapper(future):
+            try:
+                callback(chat_id, future)
+            except Exception as e:
+                logger.error(f"Daily essay pipeline error for chat ID {chat_id}: {e}")
+                self._finish(chat_id, 'send_failed')
+        return wrapper
+
+    def _finish(self, chat_id, outcome):
+        with self.all_done:
+            self.stats[outcome] += 1
+            self.pending -= 1
+            if self.pending == 0:
+                self.all_done.notify_all()
+        if outcome == 'delivered':
+            logger.info(f"Daily essay sent to chat ID {chat_id}.")
+
+    # --- Stages ---
+    def _jobs(self, assignments, cohorts):
+        for chat_id, words in assignments:
+            with self.lock:
+                self.pending += 1
+                self.stats['chats'] += 1
+                self.words[chat_id] = words
+            if not words:
+                self._finish(chat_id, 'skipped')
+        for cohort_id, cohort in enumerate(cohorts):
+            with self.lock:
+                self.stats['cohorts'] += 1
+                self.cohorts[cohort_id] = cohort.chat_ids
+            yield theAI.EssayJob(cohort_id, cohort.words)
+
+    def _after_generate(self, cohort_id, essay):
+        chat_ids = self.cohorts[cohort_id]
+        if not essay or essay.startswith("An error occurred"):
+            logger.warning(f"Failed to generate essay for chat IDs {chat_ids}.")
+            for chat_id in chat_ids:
+                self._finish(chat_id, 'llm_failed')
+            return
+
+        voice_future = self.tts_pool.submit(self._timed, 'tts', self._synthesize, essay)
+        for chat_id in chat_ids:
+            try:
+                self._deliver(chat_id, essay, voice_future)
+            except Exception as e:
+                logger.error(f"Daily essay pipeline error for chat ID {chat_id}: {e}")
+                self._finish(chat_id, 'send_failed')
+
+    def _deliver(self, chat_id, essay, voice_future):
+        self.essays[chat_id] = essay
+        text_future = self.send_pool.submit(self._timed, 'send', self._send_text, chat_id, essay)
+
+        remaining = [2]
+        def joined(chat_id, _):
+            with self.lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            self._after_text_and_voice(chat_id, text_future, voice_future)
+        text_future.add_done_callback(self._guarded(chat_id, joined))
+        voice_future.add_done_callback(self._guarded(chat_id, joined))
+
+    def _synthesize(self, essay):
+        if get_voice_file_id(essay_key(essay)): # already uploaded once, the send reuses its file_id
+            return None
+        return essay_pronounce(essay, slow=False, language='en')
+
+    def _send_text(self, chat_id, essay):
+        parts = essay.split('**')
+        for i in range(1, len(parts), 2):
+            parts[i] = f'<b>{parts[i]}</b>'
+        essay = '<b>Your daily essay:</b>\n\n' + ''.join(parts)
+        for chunk in split_text(essay):
+            msg = send_message_CONTEXT(self.context, chat_id=chat_id, text=chunk, parse_mode=ParseMode.HTML, sender='send_daily_essays') # FIXME: Convert this to markdown v2
+            if msg in ('ERROR', 'UNAUTHORIZED', 'BAD_REQUEST', None):
+                return False
+        return True
+
+    def _after_text_and_voice(self, chat_id, text_future, voice_future):
+        try:
+            sent = text_future.result()
+        except Exception as e:
+            logger.error(f"Error sending daily essay to chat ID {chat_id}: {e}")
+            sent = False
+        if not sent:
+            self._finish(chat_id, 'send_failed')
+            return
+        # the essay text is what the user reads, so its words count as reviewed even if the audio fails
+        record_reviews(chat_id, self.words[chat_id])
+        try:
+            voice = voice_future.result()
+        except Exception as e:
+            logger.error(f"Error generating daily essay audio for chat ID {chat_id}: {e}")
+            self._finish(chat_id, 'tts_failed')
+            return
+
+        future = self.send_pool.submit(self._timed, 'send', self._send_voice, chat_id, self.essays[chat_id], voice)
+        future.add_done_callback(self._guarded(chat_id, self._after_send_voice))
+
+    def _send_voice(self, chat_id, essay, voice):
+        file_key = essay_key(essay)
+        # every send reads its own stream, a rejected file_id makes any member upload again, outside the upload lock
+        audio = (lambda: BytesIO(voice.getvalue())) if voice else (lambda: essay_pronounce(essay, slow=False, language='en'))
+        send = lambda: send_voice_CONTEXT(self.context, chat_id=chat_id, voice=audio, file_key=file_key, caption="Here is your essay!")
+        if get_voice_file_id(file_key):
+            return send()
+        # the first member of a cohort uploads the audio, the others wait and reuse its file_id
+        with self.lock:
+            upload_lock = self.upload_locks.setdefault(file_key, threading.Lock())
+        with upload_lock:
+            return send()
+
+    def _after_send_voice(self, chat_id, future):
+        try:
+            msg = future.result()
+        except Exception as e:
+            logger.error(f"Error sending daily essay voice to chat ID {chat_id}: {e}")
+            msg = 'ERROR'
+        if msg in ('ERROR', 'UNAUTHORIZED', 'BAD_REQUEST', None):
+            self._finish(chat_id, 'send_failed')
+        else:
+            self._finish(chat_id, 'delivered')
+
+    def _summary(self, elapsed):
+        summary = dict(self.stats)
+        summary['seconds'] = round(elapsed, 2)
+        summary['per_minute'] = round(summary['delivered'] / elapsed * 60, 2) if elapsed > 0 else 0.0
+        summary['stage_seconds'] = {stage: round(seconds, 2) for stage, seconds in self.stage_seconds.items()}
+        summary['tts_backends'] = tts.get_stats()
+        summary['essay_cache'] = get_essay_cache_stats()
+        summary['word_cache'] = get_word_cache_stats()
+        return summary
@@ -0,0 +1,71 @@
+from config.settings import LOG_FILE_PATH, PRONUNCIATION_PREFETCH_QUEUE_SIZE
+
+import logging
+import queue
+import threading
+from .utils import pronounce, has_pronunciation
+
+logging.basicConfig(
+    filename=LOG_FILE_PATH,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+# A single background thread synthesizes the normal and slow pronunciations of words users
+# just added, so their first /pronounce is a cache hit. It never competes with interactive
+# synthesis (see tts.wait_until_idle) and when the queue is full new words are dropped.
+
+_queue = queue.Queue(maxsize=PRONUNCIATION_PREFETCH_QUEUE_SIZE)
+_pending = set()
+_lock = threading.Lock()
+_worker = None
+_stats = {'queued': 0, 'dropped': 0, 'synthesized': 0, 'skipped': 0, 'failed': 0} # synthesized/skipped count audios, two per word
+
+
+def enqueue(word: str) -> bool:
+    """Schedules `word` for prefetching, returns False if it was dropped."""
+    global _worker
+    with _lock:
+        if word in _pending:
+            return True
+        try:
+            _queue.put_nowait(word)
+        except queue.Full:
+            _stats['dropped'] += 1
+            logger.warning(f"Pronunciation prefetch queue is full, dropped '{word}'.")
+            return False
+        _pending.add(word)
+        _stats['queued'] += 1
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name='pronunciation-prefetch', daemon=True)
+            _worker.start()
+    return True
+
+
+def _run() -> None:
+    while True:
+        word = _queue.get()
+        try:
+            for slow in (False, True):
+                if has_pronunciation(word, slow=slow):
+                    outcome = 'skipped'
+                else:
+                    pronounce(word, slow=slow, language='en', background=True)
+                    outcome = 'synthesized'
+                with _lock:
+                    _stats[outcome] += 1
+        except Exception as e:
+            logger.error(f"Error prefetching the pronunciation of '{word}': {e}")
+            with _lock:
+                _stats['failed'] += 1
+        finally:
+            with _lock:
+                _pending.discard(word)
+            _queue.task_done()
+
+
+def get_stats() -> dict:
+    with _lock:
+        return {**_stats, 'queue_size': _queue.qsize()}
@@ -0,0 +1,170 @@
+from config.settings import LOG_FILE_PATH, TTS_PRONOUNCE_BACKEND, TTS_ESSAY_BACKEND, TTS_FALLBACK_BACKEND, TTS_LOCAL_WORKERS, ESPEAK_PATH, FFMPEG_PATH
+
+from gtts import gTTS
+from io import BytesIO
+
+import logging
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(
+    filename=LOG_FILE_PATH,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+# --- Backends ---
+# Every backend turns (text, slow, language) into MP3 bytes, so cached audio and joined essay
+# segments look the same whichever engine produced them.
+class TTSBackend:
+    name = None
+
+    def synthesize(self, text: str, slow: bool, language: str) -> bytes:
+        raise NotImplementedError
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate's TTS endpoint, natural sounding but remote and rate limited."""
+    name = 'gtts'
+
+    def synthesize(self, text, slow, language):
+        tts = gTTS(text=text, lang=language, slow=slow)
+        audio_file = BytesIO()
+        tts.write_to_fp(audio_file)
+        return audio_file.getvalue()
+
+
+def _espeak_synthesize(text: str, slow: bool, language: str) -> bytes:
+    wav = subprocess.run(
+        [ESPEAK_PATH, '-v', language, '-s', '120' if slow else '165', '--stdout', '--stdin'],
+        input=text.encode('utf-8'), capture_output=True, check=True, timeout=120,
+    ).stdout
+    # bare MP3 frames without an ID3 tag or Xing header, essay segments are joined into one voice (see utils._segmented_audio)
+    return subprocess.run(
+        [FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-f', 'wav', '-i', 'pipe:0',
+         '-f', 'mp3', '-b:a', '48k', '-id3v2_version', '0', '-write_xing', '0', 'pipe:1'],
+        input=wav, capture_output=True, check=True, timeout=120,
+    ).stdout
+
+
+class EspeakBackend(TTSBackend):
+    """Local espeak-ng + ffmpeg, robotic but needs no network.
+
+    The work happens in the two subprocesses, which don't hold the GIL while we wait for them,
+    so a small thread pool is enough to bound how many run at once.
+    """
+    name = 'espeak'
+
+    def __init__(self, workers=TTS_LOCAL_WORKERS):
+        self.workers = workers
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def synthesize(self, text, slow, language):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='tts-espeak')
+        return self.pool.submit(_espeak_synthesize, text, slow, language).result()
+
+
+BACKENDS = {backend.name: backend for backend in (GTTSBackend(), EspeakBackend())}
+
+# which backend serves which kind of request
+ROUTES = {
+    'pronounce': TTS_PRONOUNCE_BACKEND,
+    'essay': TTS_ESSAY_BACKEND,
+}
+
+
+# --- Metrics ---
+_stats_lock = threading.Lock()
+_stats = {name: {'calls': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0} for name in BACKENDS}
+
+def _record(name: str, seconds: float, failed: bool) -> None:
+    with _stats_lock:
+        stats = _stats[name]
+        stats['calls'] += 1
+        stats['errors'] += failed
+        stats['seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+def get_stats() -> dict:
+    with _stats_lock:
+        return {
+            name: {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'avg_seconds': round(stats['seconds'] / stats['calls'], 3) if stats['calls'] else 0.0,
+                'max_seconds': round(stats['max_seconds'], 3),
+            }
+            for name, stats in _stats.items()
+        }
+
+
+# --- Priority ---
+# background work (prefetching) only starts a synthesis while no interactive one is running
+_interactive = 0
+_idle = threading.Condition()
+
+def _begin_interactive() -> None:
+    global _interactive
+    with _idle:
+        _interactive += 1
+
+def _end_interactive() -> None:
+    global _interactive
+    with _idle:
+        _interactive -= 1
+        if _interactive == 0:
+            _idle.notify_all()
+
+def wait_until_idle() -> None:
+    with _idle:
+        while _interactive > 0:
+            _idle.wait()
+
+
+# --- Public API ---
+def backend_for(kind: str) -> str:
+    name = ROUTES.get(kind)
+    if name not in BACKENDS:
+        logger.warning(f"Unknown TTS backend '{name}' for {kind}, using gtts.")
+        return 'gtts'
+    return name
+
+
+def synthesize(kind: str, text: str, slow: bool = False, language: str = 'en', background: bool = False) -> bytes:
+    """Synthesizes with the backend configured for `kind`, falling back to TTS_FALLBACK_BACKEND if it fails.
+
+    A background request waits until no interactive request is being synthesized.
+    """
+    if background:
+        wait_until_idle()
+        return _synthesize(kind, text, slow, language)
+    _begin_interactive()
+    try:
+        return _synthesize(kind, text, slow, language)
+    finally:
+        _end_interactive()
+
+
+def _synthesize(kind: str, text: str, slow: bool, language: str) -> bytes:
+    names = [backend_for(kind)]
+    if TTS_FALLBACK_BACKEND in BACKENDS and TTS_FALLBACK_BACKEND not in names:
+        names.append(TTS_FALLBACK_BACKEND)
+
+    for i, name in enumerate(names):
+        started = time.monotonic()
+        try:
+            audio = BACKENDS[name].synthesize(text, slow, language)
+            _record(name, time.monotonic() - started, failed=False)
+            return audio
+        except Exception as e:
+            _record(name, time.monotonic() - started, failed=True)
+            if i == len(names) - 1:
+                raise
+            logger.error(f"TTS backend '{name}' failed ({kind}): {e}. Falling back to '{names[i + 1]}'")
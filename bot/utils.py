@@ -1,13 +1,17 @@
-from config.settings import LOG_FILE_PATH, RETRY_LIMIT, RETRY_DELAY
+from config.settings import LOG_FILE_PATH, RETRY_LIMIT, RETRY_DELAY, ESSAY_TTS_WORKERS, ESSAY_TTS_CHUNK_CHARS
+
+from database.databaseOps import get_voice_file_id, save_voice_file_id, forget_voice_file_id
 
-from gtts import gTTS
 from io import BytesIO
+from . import audio_cache, tts
 
 from telegram import Update, ParseMode
 from telegram.error import NetworkError, Unauthorized, BadRequest, TimedOut, RetryAfter, TelegramError
 
 import logging
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(
     filename=LOG_FILE_PATH,
@@ -18,31 +22,98 @@ logger = logging.getLogger(__name__)
 
 
 
-def pronounce(text, slow=False, language='en'):
-    tts = gTTS(text=text, lang=language, slow=slow)
-    audio_file = BytesIO()
-    tts.write_to_fp(audio_file)
-    audio_file.seek(0)
-    return audio_file
+# essay segments are synthesized concurrently, a single TTS call would go through them one after another
+essay_tts_pool = ThreadPoolExecutor(max_workers=ESSAY_TTS_WORKERS, thread_name_prefix='essay-tts-segment')
+
+
+def split_sentences(text: str, char_limit: int = ESSAY_TTS_CHUNK_CHARS) -> list[str]:
+    """Groups whole sentences into segments of at most `char_limit` characters (a longer sentence stays whole)."""
+    segments = []
+    current = ''
+    for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) + 1 > char_limit:
+            segments.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        segments.append(current)
+    return segments
+
+
+def _segmented_audio(text, slow, language) -> bytes:
+    segments = split_sentences(text)
+    if len(segments) <= 1:
+        return tts.synthesize('essay', text, slow, language)
+    # MP3 frames are self-contained, so the segments can simply be joined in order
+    return b''.join(essay_tts_pool.map(lambda segment: tts.synthesize('essay', segment, slow, language), segments))
+
+
+def _cached_audio(text, slow, language, kind, background=False) -> BytesIO:
+    key = audio_cache.audio_key(text, language, slow, tts.backend_for(kind))
+    data = audio_cache.get(key)
+    if data is None:
+        data = _segmented_audio(text, slow, language) if kind == 'essay' else tts.synthesize(kind, text, slow, language, background=background)
+        audio_cache.put(key, data)
+    return BytesIO(data)
+
 
+def pronounce(text, slow=False, language='en', background=False):
+    return _cached_audio(text, slow, language, 'pronounce', background=background)
 
-def essay_pronounce(text, slow=False, language='en'): # TODO: it is too robotic, find another way to pronounce essays, also it takes too long to generate the audio file.
-    text = text.replace('\n', '.').replace('*', '').replace('_', '').replace('-', '')
-    tts = gTTS(text=text, lang=language, slow=slow)
-    audio_file = BytesIO()
-    tts.write_to_fp(audio_file)
-    audio_file.seek(0)
-    return audio_file
+
+def has_pronunciation(text, slow=False, language='en') -> bool:
+    """True when /pronounce can answer without synthesizing: the audio is cached or was already uploaded."""
+    key = audio_cache.audio_key(text, language, slow, tts.backend_for('pronounce'))
+    return audio_cache.contains(key) or get_voice_file_id(pronunciation_key(text, slow, language)) is not None
+
+
+def _essay_speech(text: str) -> str:
+    return text.replace('\n', '. ').replace('*', '').replace('_', '').replace('-', '')
+
+def essay_pronounce(text, slow=False, language='en'): # TODO: it is too robotic, find another way to pronounce essays
+    return _cached_audio(_essay_speech(text), slow, language, 'essay')
+
+# The file_id keys are made from the audio cache key of the same audio, so they change with the
+# backend and language, and a voice uploaded before a backend switch is not sent again.
+def pronunciation_key(word: str, slow: bool = False, language: str = 'en') -> str:
+    return f"word:{audio_cache.audio_key(word, language, slow, tts.backend_for('pronounce'))}"
+
+def essay_key(text: str, slow: bool = False, language: str = 'en') -> str:
+    return f"essay:{audio_cache.audio_key(_essay_speech(text), language, slow, tts.backend_for('essay'))}"
 
 def escape_md(text: str) -> str:
     escape_chars = r"\_*[]()~`>#+-=|{}.!"
     return ''.join(f"\\{c}" if c in escape_chars else c for c in text)
 
+def split_text(text: str, char_limit: int = 4000) -> list[str]:
+    if len(text) <= char_limit:
+        return [text]
+    chunks = []
+    cb = 0
+    ca = 0
+    for i in range(0, len(text), char_limit):
+        if i+cb+char_limit > len(text):
+            chunks.append(text[i+cb:])
+            break
+        while text[i+ca+char_limit] != ' ':
+            ca += 1
+        chunks.append(text[i+cb:i+ca+char_limit])
+        cb = ca
+        ca = 0
+    return chunks
+
+# BadRequest (and TimedOut) subclass NetworkError, so BadRequest is caught first and never retried
 def send_message_UPDATE(update: Update, text: str, parse_mode = None, sender='-') -> str:
     for attempt in range(RETRY_LIMIT):
         try:
             msg = update.message.reply_text(text, parse_mode=parse_mode)
             return msg
+        except BadRequest as e:
+            logger.error(f"BadRequest error: {e}. Invalid message format ({sender})")
+            return 'BAD_REQUEST'
         except NetworkError as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send message after {RETRY_LIMIT} attempts ({sender}): {e}")
@@ -52,9 +123,6 @@ def send_message_UPDATE(update: Update, text: str, parse_mode = None, sender='-'
         except Unauthorized as e:
             logger.error(f"Unauthorized error: {e}. User may have blocked the bot ({sender})")
             return 'UNAUTHORIZED'
-        except BadRequest as e:
-            logger.error(f"BadRequest error: {e}. Invalid message format ({sender})")
-            return 'BAD_REQUEST'
         except TimedOut as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send message after {RETRY_LIMIT} attempts ({sender}): {e}")
@@ -81,6 +149,9 @@ def send_message_CONTEXT(context, text: str, chat_id:int, parse_mode = None, sen
         try:
             msg = context.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
             return msg
+        except BadRequest as e:
+            logger.error(f"BadRequest error: {e}. Invalid message format ({sender})")
+            return 'BAD_REQUEST'
         except NetworkError as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send message after {RETRY_LIMIT} attempts ({sender}): {e}")
@@ -90,9 +161,6 @@ def send_message_CONTEXT(context, text: str, chat_id:int, parse_mode = None, sen
         except Unauthorized as e:
             logger.error(f"Unauthorized error: {e}. User may have blocked the bot ({sender})")
             return 'UNAUTHORIZED'
-        except BadRequest as e:
-            logger.error(f"BadRequest error: {e}. Invalid message format ({sender})")
-            return 'BAD_REQUEST'
         except TimedOut as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send message after {RETRY_LIMIT} attempts ({sender}): {e}")
@@ -120,6 +188,9 @@ def edit_message(context, chat_id, message_id, text, parse_mode=None):
         try:
             msg = context.bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, parse_mode=parse_mode)
             return msg
+        except BadRequest as e:
+            logger.error(f"BadRequest error: {e}. Invalid message format")
+            return 'BAD_REQUEST'
         except NetworkError as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to edit message after {RETRY_LIMIT} attempts: {e}")
@@ -129,9 +200,6 @@ def edit_message(context, chat_id, message_id, text, parse_mode=None):
         except Unauthorized as e:
             logger.error(f"Unauthorized error: {e}. User may have blocked the bot")
             return 'UNAUTHORIZED'
-        except BadRequest as e:
-            logger.error(f"BadRequest error: {e}. Invalid message format")
-            return 'BAD_REQUEST'
         except TimedOut as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to edit message after {RETRY_LIMIT} attempts: {e}")
@@ -159,6 +227,9 @@ def send_audio_CONTEXT(context, chat_id, audio, title, parse_mode=None, sender='
         try:
             msg = context.bot.send_audio(chat_id=chat_id, audio=audio, title=title, parse_mode=parse_mode)
             return msg
+        except BadRequest as e:
+            logger.error(f"BadRequest error: {e}. Invalid message format")
+            return 'BAD_REQUEST'
         except NetworkError as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send audio after {RETRY_LIMIT} attempts: {e}")
@@ -168,9 +239,6 @@ def send_audio_CONTEXT(context, chat_id, audio, title, parse_mode=None, sender='
         except Unauthorized as e:
             logger.error(f"Unauthorized error: {e}. User may have blocked the bot")
             return 'UNAUTHORIZED'
-        except BadRequest as e:
-            logger.error(f"BadRequest error: {e}. Invalid message format")
-            return 'BAD_REQUEST'
         except TimedOut as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send audio after {RETRY_LIMIT} attempts: {e}")
@@ -198,6 +266,9 @@ def reply_audio_UPDATE(update, audio, title, parse_mode=None, sender='-'):
         try:
             msg = update.message.reply_audio(audio=audio, title=title, parse_mode=parse_mode)
             return msg
+        except BadRequest as e:
+            logger.error(f"BadRequest error: {e}. Invalid message format")
+            return 'BAD_REQUEST'
         except NetworkError as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send audio after {RETRY_LIMIT} attempts: {e}")
@@ -207,9 +278,6 @@ def reply_audio_UPDATE(update, audio, title, parse_mode=None, sender='-'):
         except Unauthorized as e:
             logger.error(f"Unauthorized error: {e}. User may have blocked the bot")
             return 'UNAUTHORIZED'
-        except BadRequest as e:
-            logger.error(f"BadRequest error: {e}. Invalid message format")
-            return 'BAD_REQUEST'
         except TimedOut as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send audio after {RETRY_LIMIT} attempts: {e}")
@@ -232,11 +300,34 @@ def reply_audio_UPDATE(update, audio, title, parse_mode=None, sender='-'):
             logger.error(f"Unexpected error: {e}.")
 
 
-def send_voice_CONTEXT(context, chat_id, voice, caption, parse_mode=None, sender='-'):
+def _voice_source(voice):
+    if callable(voice):
+        voice = voice()
+    if hasattr(voice, 'seek'): # a retry has to upload the stream from the start again
+        voice.seek(0)
+    return voice
+
+
+def send_voice_CONTEXT(context, chat_id, voice, caption, parse_mode=None, sender='-', file_key=None):
+    """`voice` can also be a callable producing the audio, it is only called when there is no file_id for `file_key`."""
+    file_id = get_voice_file_id(file_key) if file_key else None
     for attempt in range(RETRY_LIMIT):
         try:
+            if file_id:
+                try:
+                    return context.bot.send_voice(chat_id=chat_id, voice=file_id, caption=caption, parse_mode=parse_mode)
+                except BadRequest as e: # the stored file_id is no longer accepted, upload the audio again
+                    logger.warning(f"Stored file_id for {file_key} rejected: {e}. Uploading the audio again")
+                    forget_voice_file_id(file_key)
+                    file_id = None
+            voice = _voice_source(voice)
             msg = context.bot.send_voice(chat_id=chat_id, voice=voice, caption=caption, parse_mode=parse_mode)
+            if file_key and getattr(msg, 'voice', None):
+                save_voice_file_id(file_key, msg.voice.file_id)
             return msg
+        except BadRequest as e:
+            logger.error(f"BadRequest error: {e}. Invalid message format")
+            return 'BAD_REQUEST'
         except NetworkError as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send voice after {RETRY_LIMIT} attempts: {e}")
@@ -246,9 +337,6 @@ def send_voice_CONTEXT(context, chat_id, voice, caption, parse_mode=None, sender
         except Unauthorized as e:
             logger.error(f"Unauthorized error: {e}. User may have blocked the bot")
             return 'UNAUTHORIZED'
-        except BadRequest as e:
-            logger.error(f"BadRequest error: {e}. Invalid message format")
-            return 'BAD_REQUEST'
         except TimedOut as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send voice after {RETRY_LIMIT} attempts: {e}")
@@ -271,11 +359,26 @@ def send_voice_CONTEXT(context, chat_id, voice, caption, parse_mode=None, sender
             logger.error(f"Unexpected error: {e}.")
 
 
-def reply_voice_UPDATE(update, voice, caption, parse_mode=None, sender='-'):
+def reply_voice_UPDATE(update, voice, caption, parse_mode=None, sender='-', file_key=None):
+    """`voice` can also be a callable producing the audio, it is only called when there is no file_id for `file_key`."""
+    file_id = get_voice_file_id(file_key) if file_key else None
     for attempt in range(RETRY_LIMIT):
         try:
+            if file_id:
+                try:
+                    return update.message.reply_voice(voice=file_id, caption=caption, parse_mode=parse_mode)
+                except BadRequest as e: # the stored file_id is no longer accepted, upload the audio again
+                    logger.warning(f"Stored file_id for {file_key} rejected: {e}. Uploading the audio again")
+                    forget_voice_file_id(file_key)
+                    file_id = None
+            voice = _voice_source(voice)
             msg = update.message.reply_voice(voice=voice, caption=caption, parse_mode=parse_mode)
+            if file_key and getattr(msg, 'voice', None):
+                save_voice_file_id(file_key, msg.voice.file_id)
             return msg
+        except BadRequest as e:
+            logger.error(f"BadRequest error: {e}. Invalid message format")
+            return 'BAD_REQUEST'
         except NetworkError as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send voice after {RETRY_LIMIT} attempts: {e}")
@@ -285,9 +388,6 @@ def reply_voice_UPDATE(update, voice, caption, parse_mode=None, sender='-'):
         except Unauthorized as e:
             logger.error(f"Unauthorized error: {e}. User may have blocked the bot")
             return 'UNAUTHORIZED'
-        except BadRequest as e:
-            logger.error(f"BadRequest error: {e}. Invalid message format")
-            return 'BAD_REQUEST'
         except TimedOut as e:
             if attempt == RETRY_LIMIT - 1:
                 logger.error(f"Failed to send voice after {RETRY_LIMIT} attempts: {e}")
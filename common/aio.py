@@ -0,0 +1,38 @@
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+from config.settings import LOG_FILE_PATH
+
+logging.basicConfig(
+    filename=LOG_FILE_PATH,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+# The bot's handlers run on dispatcher threads, so the async clients live on one
+# background event loop and the sync callers hand coroutines over to it.
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='aio-loop', daemon=True).start()
+            logger.info("Background event loop started.")
+        return _loop
+
+
+def submit(coro) -> Future:
+    """Schedules the coroutine on the background loop without waiting for it."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro, timeout=None):
+    """Runs the coroutine on the background loop and blocks until it returns."""
+    return submit(coro).result(timeout)
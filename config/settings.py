@@ -33,3 +33,62 @@ if AI_MODEL is None:
 
 RETRY_LIMIT = int(os.getenv("RETRY_LIMIT", 3))
 RETRY_DELAY = int(os.getenv("RETRY_DELAY", 2))
+
+DAILY_ESSAY_LLM_WORKERS = int(os.getenv("DAILY_ESSAY_LLM_WORKERS", 4))
+DAILY_ESSAY_TTS_WORKERS = int(os.getenv("DAILY_ESSAY_TTS_WORKERS", 2))
+DAILY_ESSAY_SEND_WORKERS = int(os.getenv("DAILY_ESSAY_SEND_WORKERS", 8))
+
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 16384))
+DB_MMAP_SIZE_MB = int(os.getenv("DB_MMAP_SIZE_MB", 64))
+DB_BUSY_RETRIES = int(os.getenv("DB_BUSY_RETRIES", 5))
+DB_BUSY_RETRY_DELAY = float(os.getenv("DB_BUSY_RETRY_DELAY", 0.05))
+
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", 20))
+SCRAPE_MAX_CONNECTIONS = int(os.getenv("SCRAPE_MAX_CONNECTIONS", 20))
+SCRAPE_PER_HOST_LIMIT = int(os.getenv("SCRAPE_PER_HOST_LIMIT", 8))
+
+NEGATIVE_CACHE_TTL_HOURS = int(os.getenv("NEGATIVE_CACHE_TTL_HOURS", 24))
+WORD_CACHE_SIZE = int(os.getenv("WORD_CACHE_SIZE", 2048))
+
+# quality (0-5) given to the words of a delivered daily essay when the user doesn't grade them with /review
+SM2_PASSIVE_QUALITY = int(os.getenv("SM2_PASSIVE_QUALITY", 4))
+
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "database/audio_cache")
+AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", 256))
+
+ESSAY_TTS_WORKERS = int(os.getenv("ESSAY_TTS_WORKERS", 4))
+ESSAY_TTS_CHUNK_CHARS = int(os.getenv("ESSAY_TTS_CHUNK_CHARS", 400))
+
+# TTS backends: "gtts" (remote) or "espeak" (local espeak-ng + ffmpeg, at most TTS_LOCAL_WORKERS at a time)
+TTS_PRONOUNCE_BACKEND = os.getenv("TTS_PRONOUNCE_BACKEND", "gtts")
+TTS_ESSAY_BACKEND = os.getenv("TTS_ESSAY_BACKEND", "gtts")
+TTS_FALLBACK_BACKEND = os.getenv("TTS_FALLBACK_BACKEND", "")
+TTS_LOCAL_WORKERS = int(os.getenv("TTS_LOCAL_WORKERS", 2))
+ESPEAK_PATH = os.getenv("ESPEAK_PATH", "espeak-ng")
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+PRONUNCIATION_PREFETCH_QUEUE_SIZE = int(os.getenv("PRONUNCIATION_PREFETCH_QUEUE_SIZE", 100))
+
+AI_MAX_IN_FLIGHT = int(os.getenv("AI_MAX_IN_FLIGHT", 4))
+AI_TOKENS_PER_MINUTE = int(os.getenv("AI_TOKENS_PER_MINUTE", 200000)) # 0 disables the budget
+
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 120))
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", 10))
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", 20))
+AI_RETRY_LIMIT = int(os.getenv("AI_RETRY_LIMIT", 4))
+AI_BACKOFF_BASE = float(os.getenv("AI_BACKOFF_BASE", 1))
+AI_BACKOFF_MAX = float(os.getenv("AI_BACKOFF_MAX", 30))
+
+# seconds between edits of a streamed /essay message, Telegram rate limits faster edits
+ESSAY_STREAM_EDIT_INTERVAL = float(os.getenv("ESSAY_STREAM_EDIT_INTERVAL", 1.5))
+
+ESSAY_CACHE_TTL_HOURS = int(os.getenv("ESSAY_CACHE_TTL_HOURS", 72))
+ESSAY_CACHE_MAX_ENTRIES = int(os.getenv("ESSAY_CACHE_MAX_ENTRIES", 2000)) # 0 disables the essay cache
+
+# daily essays are shared by users with similar due words, 1 only groups identical word sets
+DAILY_ESSAY_COHORT_JACCARD = float(os.getenv("DAILY_ESSAY_COHORT_JACCARD", 0.8))
+DAILY_ESSAY_COHORT_MAX_WORDS = int(os.getenv("DAILY_ESSAY_COHORT_MAX_WORDS", 40))
+
+# most words of the review queue shown by /responsibility and used for an essay, the most overdue go first
+DUE_WORDS_LIMIT = int(os.getenv("DUE_WORDS_LIMIT", 30))
@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+import logging
+import time
+from contextlib import contextmanager
+from config.settings import DB_PATH, LOG_FILE_PATH, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE_MB, DB_BUSY_RETRIES, DB_BUSY_RETRY_DELAY
+
+db_path = DB_PATH
+
+logging.basicConfig(
+    filename=LOG_FILE_PATH,
+    format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+_local = threading.local()
+# every open connection by the thread that owns it, so the ones of finished threads can be closed
+_connections = {}
+_connections_lock = threading.Lock()
+# WAL lets any number of readers run next to one writer, so only writes are serialized.
+_write_lock = threading.Lock()
+
+
+def _open_connection() -> sqlite3.Connection:
+    # only its own thread uses a connection, check_same_thread is off so another thread can close it once the owner is gone
+    conn = sqlite3.connect(db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")      # readers don't block the writer and vice versa
+    conn.execute("PRAGMA synchronous=NORMAL")    # safe with WAL, avoids an fsync per commit
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    logger.info(f"Opened SQLite connection for thread {threading.current_thread().name}.")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """Returns the calling thread's long-lived connection, opening it on first use.
+
+    Use it as `with get_connection() as conn:` so the transaction is committed or
+    rolled back; the connection itself stays open for the next call.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _open_connection()
+        _local.conn = conn
+        with _connections_lock:
+            _connections[threading.current_thread()] = conn
+    return conn
+
+
+def close_connection() -> None:
+    """Closes the calling thread's connection, the next call opens a new one."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        with _connections_lock:
+            _connections.pop(threading.current_thread(), None)
+        conn.close()
+        _local.conn = None
+
+
+def close_finished_connections() -> int:
+    """Closes the connections of threads that have exited, e.g. after a worker pool is shut down."""
+    with _connections_lock:
+        finished = [thread for thread in _connections if not thread.is_alive()]
+        conns = [_connections.pop(thread) for thread in finished]
+    for conn in conns:
+        conn.close()
+    if conns:
+        logger.info(f"Closed {len(conns)} SQLite connections of finished threads.")
+    return len(conns)
+
+
+def close_all_connections() -> None:
+    """Closes every connection, only for shutdown when no other thread uses the database anymore."""
+    with _connections_lock:
+        conns = list(_connections.values())
+        _connections.clear()
+    for conn in conns:
+        conn.close()
+    _local.conn = None
+
+
+def _is_busy(e: Exception) -> bool:
+    return isinstance(e, sqlite3.OperationalError) and ('locked' in str(e) or 'busy' in str(e))
+
+
+def _retry_on_busy(operation):
+    for attempt in range(DB_BUSY_RETRIES):
+        try:
+            return operation()
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == DB_BUSY_RETRIES - 1:
+                raise
+            logger.warning(f"Database busy ({e}), retrying...")
+            time.sleep(DB_BUSY_RETRY_DELAY * 2**attempt)
+
+
+# --- Data Access ---
+def fetch_all(query: str, params=()) -> list[tuple]:
+    return _retry_on_busy(lambda: get_connection().execute(query, params).fetchall())
+
+
+def fetch_one(query: str, params=()) -> tuple:
+    return _retry_on_busy(lambda: get_connection().execute(query, params).fetchone())
+
+
+def fetch_iter(query: str, params=()):
+    """Yields rows one by one instead of loading the whole result set."""
+    cursor = _retry_on_busy(lambda: get_connection().execute(query, params))
+    yield from cursor
+
+
+def execute(query: str, params=()) -> sqlite3.Cursor:
+    """Runs a single write statement in its own transaction and returns the cursor."""
+    def operation():
+        with _write_lock, get_connection() as conn:
+            return conn.execute(query, params)
+    return _retry_on_busy(operation)
+
+
+@contextmanager
+def transaction():
+    """Yields a cursor inside an IMMEDIATE transaction for multi-statement writes.
+
+    Only the BEGIN is retried on SQLITE_BUSY, after that the write lock is held.
+    """
+    with _write_lock:
+        conn = get_connection()
+        _retry_on_busy(lambda: conn.execute("BEGIN IMMEDIATE"))
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
@@ -1,12 +1,18 @@
 import sqlite3
+import asyncio
+import json
 import threading
 import logging
+from itertools import groupby, islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
 import scraping.word_scraper as word
-from config.settings import DB_PATH, LOG_FILE_PATH, RETRY_LIMIT, RETRY_DELAY
-
-db_path = DB_PATH
-db_lock = threading.Lock()
+from common import aio
+from config.settings import LOG_FILE_PATH, RETRY_LIMIT, RETRY_DELAY, NEGATIVE_CACHE_TTL_HOURS, WORD_CACHE_SIZE, SM2_PASSIVE_QUALITY, DUE_WORDS_LIMIT, ESSAY_CACHE_TTL_HOURS, ESSAY_CACHE_MAX_ENTRIES
+from .connection import fetch_all, fetch_one, fetch_iter, execute, transaction
+from .cache import LRUCache, SingleFlight
+from . import srs
 
 
 logging.basicConfig(
@@ -20,12 +26,48 @@ logger = logging.getLogger(__name__)
 from win10toast import ToastNotifier
 toaster = ToastNotifier() # i use this only for new user notifications
 
+# writes that finish after the user already got a reply (e.g. late turkish meanings)
+write_back_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write-back')
+
+negative_cache_stats = {'hits': 0, 'misses': 0}
+negative_cache_lock = threading.Lock()
+
+essay_cache_stats = {'hits': 0, 'misses': 0, 'saved_seconds': 0.0}
+essay_cache_lock = threading.Lock()
+
+
+class Sense(NamedTuple):
+    definition: str
+    pos: str
+    level: str
+
+class WordEntry(NamedTuple):
+    id: int
+    senses: list[Sense]
+    examples: list[str]
+    turkish: list[str]
+
+    @property
+    def definitions(self) -> list[str]:
+        return [sense.definition for sense in self.senses]
+
+def _encode_entry(senses: list[dict], examples: list[str], turkish: list[str] = None) -> str:
+    return json.dumps({'senses': senses, 'examples': examples, 'turkish': turkish}, ensure_ascii=False, separators=(',', ':'))
+
+def _decode_entry(word_id: int, text: str) -> WordEntry:
+    data = json.loads(text)
+    return WordEntry(word_id, [Sense(**sense) for sense in data['senses']], data['examples'], data.get('turkish'))
+
+word_cache = LRUCache(WORD_CACHE_SIZE)
+word_flights = SingleFlight()
+
+def _cache_key(wrd: str) -> str:
+    return wrd.strip().lower()
+
 
 # --- DataBase Functions ---
 def init_db():
-    with db_lock:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
+    with transaction() as c:
         c.execute('''CREATE TABLE IF NOT EXISTS chat_ids (
                         chat_id INTEGER PRIMARY KEY,
                         first_name TEXT,
@@ -33,20 +75,13 @@ def init_db():
                         username TEXT,
                         email TEXT DEFAULT NULL,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        first_reminder INTEGER DEFAULT 0,
-                        second_reminder INTEGER DEFAULT 1,
-                        third_reminder INTEGER DEFAULT 3,
-                        fourth_reminder INTEGER DEFAULT 6,
-                        fifth_reminder INTEGER DEFAULT 14,
                         english_level TEXT DEFAULT B2,
                         UNIQUE (chat_id) ON CONFLICT REPLACE
                         )''')
         c.execute('''CREATE TABLE IF NOT EXISTS words (
                         id INTEGER PRIMARY KEY,
                         word TEXT,
-                        definitions TEXT,
-                        examples TEXT,
-                        turkish_meaning TEXT DEFAULT NULL,
+                        entry TEXT,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         UNIQUE (word) ON CONFLICT REPLACE
                         )''')
@@ -55,6 +90,12 @@ def init_db():
                         chat_id INTEGER,
                         word_id INTEGER,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        step INTEGER NOT NULL DEFAULT 0,
+                        ease REAL NOT NULL DEFAULT 2.5,
+                        interval_days INTEGER NOT NULL DEFAULT 0,
+                        repetitions INTEGER NOT NULL DEFAULT 0,
+                        next_due TEXT,
+                        last_reviewed TEXT,
                         FOREIGN KEY (chat_id) REFERENCES chat_ids (chat_id),
                         FOREIGN KEY (word_id) REFERENCES words (id),
                         UNIQUE (chat_id, word_id) ON CONFLICT REPLACE
@@ -65,64 +106,280 @@ def init_db():
                             message TEXT,
                             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
                             )''')
-        conn.commit()
-        conn.close()
+        c.execute('''CREATE TABLE IF NOT EXISTS missing_words (
+                        word TEXT PRIMARY KEY,
+                        checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS reminder_intervals (
+                        chat_id INTEGER,
+                        position INTEGER,
+                        days INTEGER NOT NULL,
+                        PRIMARY KEY (chat_id, position)
+                        ) WITHOUT ROWID''')
+        _migrate_word_entries(c)
+        _migrate_reminder_columns(c)
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_user_words_chat_created ON user_words (chat_id, created_at)''')
+        _migrate_review_schedule(c)
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_user_words_chat_due ON user_words (chat_id, next_due)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_user_words_chat_reviewed ON user_words (chat_id, last_reviewed)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS user_daily_counts (
+                        chat_id INTEGER,
+                        day TEXT,
+                        count INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (chat_id, day)
+                        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS user_stats (
+                        chat_id INTEGER PRIMARY KEY,
+                        total INTEGER NOT NULL DEFAULT 0,
+                        current_streak INTEGER NOT NULL DEFAULT 0,
+                        streak_end TEXT,
+                        longest_streak INTEGER NOT NULL DEFAULT 0
+                        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS voice_files (
+                        file_key TEXT PRIMARY KEY,
+                        file_id TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS essay_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        essay TEXT NOT NULL,
+                        seconds REAL NOT NULL DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_essay_cache_used ON essay_cache(used_at)''')
+        if c.execute("SELECT 1 FROM user_stats LIMIT 1").fetchone() is None and c.execute("SELECT 1 FROM user_words LIMIT 1").fetchone():
+            _rebuild_user_stats(c)
+        c.execute('''DELETE FROM missing_words WHERE checked_at < datetime('now', ?)''', (f'-{NEGATIVE_CACHE_TTL_HOURS} hours',))
+        c.execute('''DELETE FROM essay_cache WHERE created_at < datetime('now', ?)''', (f'-{ESSAY_CACHE_TTL_HOURS} hours',))
     logger.info("Database initialized.")
 
+def _migrate_word_entries(c) -> None:
+    """One-shot move of the old ;;;-joined columns into the JSON entry column."""
+    columns = [row[1] for row in c.execute("PRAGMA table_info(words)")]
+    legacy = [column for column in ('definitions', 'examples', 'turkish_meaning') if column in columns]
+    if not legacy:
+        return
+    if 'entry' not in columns:
+        c.execute("ALTER TABLE words ADD COLUMN entry TEXT")
+
+    rows = c.execute("SELECT id, definitions, examples, turkish_meaning FROM words WHERE entry IS NULL").fetchall()
+    for word_id, definitions, examples, turkish in rows:
+        senses = [{'definition': d, 'pos': None, 'level': None} for d in (definitions or '').split(';;;') if d]
+        c.execute("UPDATE words SET entry = ? WHERE id = ?", (_encode_entry(
+            senses,
+            [e for e in (examples or '').split(';;;') if e],
+            turkish.split(';;;') if turkish else None,
+        ), word_id))
+
+    for column in legacy:
+        try:
+            c.execute(f"ALTER TABLE words DROP COLUMN {column}")
+        except sqlite3.OperationalError: # DROP COLUMN needs SQLite 3.35
+            c.execute(f"UPDATE words SET {column} = NULL")
+    logger.info(f"Migrated {len(rows)} words to the structured entry format.")
+
+def _migrate_reminder_columns(c) -> None:
+    """One-shot move of the five fixed reminder columns of chat_ids into reminder_intervals."""
+    legacy = ['first_reminder', 'second_reminder', 'third_reminder', 'fourth_reminder', 'fifth_reminder']
+    columns = [row[1] for row in c.execute("PRAGMA table_info(chat_ids)")]
+    if not all(column in columns for column in legacy):
+        return
+
+    rows = c.execute(f'''SELECT chat_id, {', '.join(legacy)} FROM chat_ids c
+                         WHERE NOT EXISTS (SELECT 1 FROM reminder_intervals r WHERE r.chat_id = c.chat_id)''').fetchall()
+    for chat_id, *reminders in rows:
+        _insert_reminders(c, chat_id, [reminder for reminder in reminders if reminder is not None] or DEFAULT_REMINDERS)
+
+    for column in legacy:
+        try:
+            c.execute(f"ALTER TABLE chat_ids DROP COLUMN {column}")
+        except sqlite3.OperationalError: # DROP COLUMN needs SQLite 3.35, the columns are simply no longer read
+            break
+    logger.info(f"Migrated the reminder cycles of {len(rows)} users.")
+
+def _migrate_review_schedule(c) -> None:
+    """Adds the review schedule columns and queues every word that has no due date yet."""
+    columns = [row[1] for row in c.execute("PRAGMA table_info(user_words)")]
+    for column, definition in (
+        ('step', 'INTEGER NOT NULL DEFAULT 0'),
+        ('ease', 'REAL NOT NULL DEFAULT 2.5'),
+        ('interval_days', 'INTEGER NOT NULL DEFAULT 0'),
+        ('repetitions', 'INTEGER NOT NULL DEFAULT 0'),
+        ('next_due', 'TEXT'),
+        ('last_reviewed', 'TEXT'),
+    ):
+        if column not in columns:
+            c.execute(f"ALTER TABLE user_words ADD COLUMN {column} {definition}")
+
+    rows = c.execute("SELECT id, chat_id, created_at FROM user_words WHERE next_due IS NULL").fetchall()
+    if not rows:
+        return
+    today = datetime.now(timezone.utc).date()
+    offsets = {}
+    for row_id, chat_id, created_at in rows:
+        if chat_id not in offsets:
+            offsets[chat_id] = _reminder_offsets(c, chat_id)
+        schedule = srs.initial_schedule(row_id, _day(created_at), today, offsets[chat_id])
+        c.execute('''UPDATE user_words SET step = ?, ease = ?, interval_days = ?, repetitions = ?, next_due = ? WHERE id = ?''',
+                  (*schedule[:4], schedule.next_due.isoformat(), row_id))
+    logger.info(f"Scheduled {len(rows)} user words for review.")
+
+
+# --- Negative Cache ---
+def is_known_missing(wrd: str) -> bool:
+    try:
+        result = fetch_one('''SELECT 1 FROM missing_words WHERE word = ? AND checked_at >= datetime('now', ?)''',
+                           (wrd, f'-{NEGATIVE_CACHE_TTL_HOURS} hours'))
+    except sqlite3.Error as e:
+        logger.error(f"Database error checking missing word ({wrd}): {e}")
+        result = None
+    with negative_cache_lock:
+        negative_cache_stats['hits' if result else 'misses'] += 1
+    return result is not None
+
+def remember_missing(wrd: str) -> None:
+    try:
+        execute('''INSERT OR REPLACE INTO missing_words (word, checked_at) VALUES (?, CURRENT_TIMESTAMP)''', (wrd,))
+    except sqlite3.Error as e:
+        logger.error(f"Database error remembering missing word ({wrd}): {e}")
+
+def get_negative_cache_stats() -> dict:
+    with negative_cache_lock:
+        return dict(negative_cache_stats)
+
+
 def add_word_to_db(wrd: str) -> tuple[int, list[str], list[str]]:
-    definitions, examples = word.scrape_the_word(wrd)
-    turkish = word.scrape_turkish_meaning(wrd)
-    if not definitions and not examples:
+    if is_known_missing(wrd):
+        logger.info(f"Word '{wrd}' is known to be missing, skipping the scrape. Negative cache: {get_negative_cache_stats()}")
+        return None
+
+    # both pages are requested at once; the reply only waits for the English one
+    english = aio.submit(word.fetch_the_senses(wrd))
+    turkish = aio.submit(word.fetch_turkish_meaning(wrd))
+
+    try:
+        senses, examples = english.result()
+    except word.ScrapeError as e:
+        logger.error(f"Could not scrape word ({wrd}): {e}")
+        return None
+    if not senses and not examples:
         logger.warning(f"No definitions or examples found for word: {wrd}")
+        remember_missing(wrd)
         return None
-    if not turkish:
-        logger.warning(f"No turkish meaning found for word: {wrd}")
-        turkish = None
     
-    with db_lock:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''INSERT INTO words (word, definitions, examples, turkish_meaning) VALUES (?, ?, ?, ?)''',
-                    (wrd, ';;;'.join(definitions), ';;;'.join(examples), ';;;'.join(turkish) if turkish else None))
-        word_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+    # an upsert keeps the row id stable, REPLACE would orphan the user_words rows pointing at it
+    with transaction() as cursor:
+        cursor.execute('''INSERT INTO words (word, entry) VALUES (?, ?)
+                          ON CONFLICT (word) DO UPDATE SET entry = excluded.entry''',
+                    (wrd, _encode_entry(senses, examples)))
+        cursor.execute('''SELECT id FROM words WHERE word = ?''', (wrd,))
+        word_id = cursor.fetchone()[0]
+    entry = WordEntry(word_id, [Sense(**sense) for sense in senses], examples, None)
+    word_cache.put(_cache_key(wrd), entry)
+    turkish.add_done_callback(lambda future: write_back_pool.submit(_save_turkish_meaning, wrd, future))
 
     logger.info(f"Word '{wrd}' added to database with ID {word_id}.")
-    return word_id, definitions, examples
+    return word_id, entry.definitions, examples
 
-def get_word_from_db(wrd: str) -> tuple[list[str], list[str]]:
+def _save_turkish_meaning(wrd: str, future) -> None:
     try:
-        with db_lock:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute('''SELECT id, definitions, examples FROM words WHERE word = ?''', (wrd,))
-            result = cursor.fetchone()
-            conn.close()
-
-        if result:
-            word_id, definitions, examples = result
-            logger.info(f"Retrieved definitions and examples for word '{wrd}' from database.")
-            return word_id, definitions.split(';;;'), examples.split(';;;')
-        else:
-            logger.info(f"Word '{wrd}' not found in database.")
-            return 'NOT IN DATABASE'
-    except sqlite3.Error as e: 
-        logger.error(f"SQLite error: {e}")
-        return None, None, None
+        turkish = future.result()
+        if not turkish:
+            logger.warning(f"No turkish meaning found for word: {wrd}")
+            return
+        store_turkish_meaning(wrd, turkish)
     except Exception as e:
-        logger.error(f"Error retrieving a word ({wrd}): {e}")
-        return None, None, None
+        logger.error(f"Error while saving turkish meaning ({wrd}): {e}")
+
+def store_turkish_meaning(wrd: str, turkish: list[str]) -> bool:
+    try:
+        c = execute('''UPDATE words SET entry = json_set(entry, '$.turkish', json(?)) WHERE word = ?''', (json.dumps(turkish, ensure_ascii=False), wrd))
+        word_cache.invalidate(_cache_key(wrd))
+        if c.rowcount > 0:
+            logger.info(f"Turkish meaning of '{wrd}' saved.")
+        return c.rowcount > 0
+    except sqlite3.Error as e:
+        logger.error(f"Database error saving turkish meaning ({wrd}): {e}")
+        return False
+
+def get_turkish_meanings(wrds: list[str]) -> dict[str, list[str]]:
+    """Read-through lookup: stored meanings first, the misses are scraped together and written back."""
+    meanings = {}
+    misses = []
+    for wrd in wrds:
+        try:
+            entry = get_word_entry(wrd)
+        except Exception as e:
+            logger.error(f"Error reading word entry ({wrd}): {e}")
+            entry = None
+        if entry and entry.turkish:
+            meanings[wrd] = entry.turkish
+        elif wrd not in misses:
+            misses.append(wrd)
+
+    if misses:
+        async def scrape_all():
+            return await asyncio.gather(*(word.fetch_turkish_meaning(wrd) for wrd in misses), return_exceptions=True)
+        for wrd, turkish in zip(misses, aio.run(scrape_all())):
+            if isinstance(turkish, Exception):
+                logger.error(f"Could not scrape turkish meaning ({wrd}): {turkish}")
+                turkish = []
+            meanings[wrd] = turkish
+            if turkish:
+                store_turkish_meaning(wrd, turkish) # only words already in the words table get stored
+    return meanings
+
+def get_word_entry(wrd: str) -> WordEntry:
+    """Returns the parsed entry of a stored word, or None when it isn't in the database."""
+    key = _cache_key(wrd)
+    entry = word_cache.get(key)
+    if entry is not None:
+        return entry
+    return _read_word_entry(key)
+
+def _read_word_entry(key: str) -> WordEntry:
+    result = fetch_one('''SELECT id, entry FROM words WHERE word = ?''', (key,))
+    if not result:
+        return None
+    entry = _decode_entry(*result)
+    word_cache.put(key, entry)
+    return entry
+
+def resolve_word(wrd: str) -> tuple[int, list[str], list[str]]:
+    """Returns (id, definitions, examples) of a word, scraping and storing it when needed.
+
+    Concurrent requests for the same unknown word share one scrape and one write.
+    Returns None when the word has no entry.
+    """
+    entry = get_word_entry(wrd)
+    if entry:
+        return entry.id, entry.definitions, entry.examples
+    logger.info(f"Word '{wrd}' is not in the database. Word cache: {get_word_cache_stats()}")
+    return word_flights.do(_cache_key(wrd), _add_if_missing, wrd)
+
+def _add_if_missing(wrd: str) -> tuple[int, list[str], list[str]]:
+    # a flight for this word may have finished between our cache miss and taking the lead,
+    # peek so the lookup isn't counted twice
+    key = _cache_key(wrd)
+    entry = word_cache.peek(key) or _read_word_entry(key)
+    if entry:
+        return entry.id, entry.definitions, entry.examples
+    return add_word_to_db(wrd)
+
+def get_word_cache_stats() -> dict:
+    return word_cache.stats()
 
 
 def match_user_with_word(chat_id: int, word_id: int) -> bool: 
     try:
-        with db_lock:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO user_words (chat_id, word_id) VALUES (?, ?)''', (chat_id, word_id)) 
-            conn.commit()
-            conn.close()
+        with transaction() as c:
+            # the unique (chat_id, word_id) constraint replaces an existing row, moving it to today
+            # and restarts its review schedule from the first reminder
+            old = c.execute('''SELECT created_at FROM user_words WHERE chat_id = ? AND word_id = ?''', (chat_id, word_id)).fetchone()
+            next_due = srs.first_due(datetime.now(timezone.utc).date(), _reminder_offsets(c, chat_id))
+            c.execute('''INSERT INTO user_words (chat_id, word_id, next_due) VALUES (?, ?, ?)''', (chat_id, word_id, next_due.isoformat()))
+            _count_word(c, chat_id, old[0][:10] if old else None)
         return True
     except sqlite3.Error as e: 
         logger.error(f"SQLite error: {e}")
@@ -137,162 +394,194 @@ def save_chat_id(user) -> bool:
         logger.warning("No chat ID found in user object.")
         return False
     
-    with db_lock:
-        try:
-            with sqlite3.connect(db_path) as conn:
-                c = conn.cursor()
-                c.execute("""
-                    INSERT INTO chat_ids (chat_id, first_name, last_name, username)
-                    VALUES (?, ?, ?, ?)
-                    """, (
-                    user.id,
-                    user.first_name,
-                    user.last_name,
-                    user.username
-                ))
-                conn.commit()
-                toaster.show_toast("The Vocabulary Bot", f"New user: {user.first_name}", duration=5, threaded=True)
-                logger.info(f"Attempted to save chat ID {chat_id}.")
-                return True
-        except sqlite3.Error as e:
-            logger.error(f"Database error saving chat ID {chat_id}: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Error while saving user: {e}")
-            return False
+    try:
+        with transaction() as c:
+            c.execute("""
+                INSERT INTO chat_ids (chat_id, first_name, last_name, username)
+                VALUES (?, ?, ?, ?)
+                """, (
+                user.id,
+                user.first_name,
+                user.last_name,
+                user.username
+            ))
+            if c.execute("SELECT 1 FROM reminder_intervals WHERE chat_id = ?", (chat_id,)).fetchone() is None:
+                _insert_reminders(c, chat_id, DEFAULT_REMINDERS)
+        toaster.show_toast("The Vocabulary Bot", f"New user: {user.first_name}", duration=5, threaded=True)
+        logger.info(f"Attempted to save chat ID {chat_id}.")
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Database error saving chat ID {chat_id}: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Error while saving user: {e}")
+        return False
 
 def delete_chat_id(chat_id) -> bool:
-    with db_lock:
-        try:
-            with sqlite3.connect(db_path) as conn:
-                c = conn.cursor()
-                c.execute("DELETE FROM chat_ids WHERE chat_id = ?", (chat_id,))
-                conn.commit()
-                if conn.total_changes > 0:
-                    logger.info(f"Chat ID {chat_id} deleted.")
-                    return True
-                else:
-                    logger.warning(f"Chat ID {chat_id} not found for deletion.")
-                    return False
-        except sqlite3.Error as e:
-            logger.error(f"Database error deleting chat ID {chat_id}: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Error while deleting chat ID {chat_id}: {e}")
+    try:
+        with transaction() as c:
+            c.execute("DELETE FROM chat_ids WHERE chat_id = ?", (chat_id,))
+            deleted = c.rowcount
+            c.execute("DELETE FROM reminder_intervals WHERE chat_id = ?", (chat_id,))
+        if deleted > 0:
+            logger.info(f"Chat ID {chat_id} deleted.")
+            return True
+        else:
+            logger.warning(f"Chat ID {chat_id} not found for deletion.")
             return False
+    except sqlite3.Error as e:
+        logger.error(f"Database error deleting chat ID {chat_id}: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Error while deleting chat ID {chat_id}: {e}")
+        return False
 
 def get_chat_ids() -> list[int]:
-    with db_lock:
-        try:
-            with sqlite3.connect(db_path) as conn:
-                c = conn.cursor()
-                c.execute("""SELECT chat_id FROM chat_ids""")
-                chat_ids = c.fetchall()
-                chat_ids = [chat_id[0] for chat_id in chat_ids]
-                return chat_ids
-        except sqlite3.Error as e:
-            logger.error(f"Database error getting chat IDs: {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Error while getting chat IDs: {e}")
-            return []
+    try:
+        chat_ids = fetch_all("""SELECT chat_id FROM chat_ids""")
+        chat_ids = [chat_id[0] for chat_id in chat_ids]
+        return chat_ids
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting chat IDs: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error while getting chat IDs: {e}")
+        return []
 
 
-def get_reminder_cycle_of_a_user(chat_id: int) -> tuple[int, int, int, int, int]:
-    with db_lock:
-        try:
-            with sqlite3.connect(db_path) as conn:
-                c = conn.cursor()
-                c.execute("""SELECT first_reminder, second_reminder, third_reminder, fourth_reminder, fifth_reminder FROM chat_ids WHERE chat_id = ?""", (chat_id,))
-                result = c.fetchall()
-                result = result[0] if result else None
-                if result:
-                    return result
-                else:
-                    logger.warning(f"No reminder cycle found for chat ID {chat_id}.")
-                    return None
-        except sqlite3.Error as e:
-            logger.error(f"Database error getting reminder cycle ({chat_id}): {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Error while getting reminder cycle ({chat_id}): {e}")
+def get_reminder_cycle_of_a_user(chat_id: int) -> list[int]:
+    try:
+        result = fetch_all("""SELECT days FROM reminder_intervals WHERE chat_id = ? ORDER BY position""", (chat_id,))
+        if result:
+            return [row[0] for row in result]
+        else:
+            logger.warning(f"No reminder cycle found for chat ID {chat_id}.")
             return None
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting reminder cycle ({chat_id}): {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error while getting reminder cycle ({chat_id}): {e}")
+        return None
 
-def change_reminder_cycle_of_a_user(chat_id, first=1, second=2, third=4, fourth=8, fifth=16) -> bool:
-    with db_lock:
-        try:
-            with sqlite3.connect(db_path) as conn:
-                c = conn.cursor()
-                c.execute("""
-                    UPDATE chat_ids
-                    SET first_reminder = ?,
-                        second_reminder = ?,
-                        third_reminder = ?,
-                        fourth_reminder = ?,
-                        fifth_reminder = ?
-                    WHERE chat_id = ?
-                """, (first, second, third, fourth, fifth, chat_id))
-                conn.commit()
-                if conn.total_changes == 0:
-                    logger.warning(f"No changes made to reminder cycle for chat ID {chat_id}.")
-                    return False                    
-                
-                logger.info(f"Altered {chat_id}'s reminder cycle.")
-                return True
-        except sqlite3.Error as e:
-            logger.error(f"Database error altering a reminder ({chat_id}): {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Error while altering a reminder ({chat_id}): {e}")
-            return False
+def change_reminder_cycle_of_a_user(chat_id: int, reminders: list[int], today=None) -> bool:
+    """Replaces the user's reminder intervals and moves the user's words onto the new cycle (see srs.change_cycle)."""
+    today = today or datetime.now(timezone.utc).date()
+    reminders = sorted(set(reminders))
+    if not MIN_REMINDERS <= len(reminders) <= MAX_REMINDERS or reminders[0] < 0:
+        logger.warning(f"Rejected reminder cycle {reminders} for chat ID {chat_id}.")
+        return False
+    try:
+        with transaction() as c:
+            if c.execute("SELECT 1 FROM chat_ids WHERE chat_id = ?", (chat_id,)).fetchone() is None:
+                logger.warning(f"No changes made to reminder cycle for chat ID {chat_id}.")
+                return False
+            old_offsets = _reminder_offsets(c, chat_id)
+            c.execute("DELETE FROM reminder_intervals WHERE chat_id = ?", (chat_id,))
+            _insert_reminders(c, chat_id, reminders)
+
+            rows = c.execute('''SELECT id, created_at, step, ease, interval_days, repetitions, next_due
+                                FROM user_words WHERE chat_id = ?''', (chat_id,)).fetchall()
+            updates = []
+            for row_id, created_at, step, ease, interval, repetitions, next_due in rows:
+                current = srs.Schedule(step, ease, interval, repetitions, _day(next_due) if next_due else today)
+                schedule = srs.change_cycle(current, _day(created_at), today, old_offsets, reminders)
+                updates.append((*schedule[:4], schedule.next_due.isoformat(), row_id))
+            c.executemany('''UPDATE user_words SET step = ?, ease = ?, interval_days = ?, repetitions = ?, next_due = ? WHERE id = ?''', updates)
+
+        logger.info(f"Altered {chat_id}'s reminder cycle.")
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Database error altering a reminder ({chat_id}): {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Error while altering a reminder ({chat_id}): {e}")
+        return False
 
 def save_all_messages(chat_id, message):
-    with db_lock:
-        try:
-            with sqlite3.connect(db_path) as conn:
-                c = conn.cursor()
-                c.execute("""
-                    INSERT INTO messages (chat_id, message)
-                    VALUES (?, ?)
-                """, (chat_id, message))
-                conn.commit()
-        except sqlite3.Error as e:
-            logger.error(f"Error saving message: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error saving message: {e}")
+    try:
+        execute("""
+            INSERT INTO messages (chat_id, message)
+            VALUES (?, ?)
+        """, (chat_id, message))
+    except sqlite3.Error as e:
+        logger.error(f"Error saving message: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error saving message: {e}")
 
 
-def responsible_words(chat_id: int) -> list[str]:
-    now = datetime.now(timezone.utc)
-    reminders = get_reminder_cycle_of_a_user(chat_id)
-    if reminders is None:
-        return
-    time_params = [(now - timedelta(days=reminder)).date() for reminder in reminders]
-    placeholders = ', '.join(['?'] * len(time_params))
-    time_condition = f"AND DATE(uw.created_at) IN ({placeholders})"
+# created_at is stored as CURRENT_TIMESTAMP text ('YYYY-MM-DD HH:MM:SS', UTC), so the filters
+# compare against strings in the same format and never wrap the column in DATE(), which would
+# stop SQLite from using idx_user_words_chat_created.
+def _timestamp(moment) -> str:
+    if isinstance(moment, datetime):
+        return moment.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    return moment.strftime('%Y-%m-%d 00:00:00')
 
-    with db_lock:
-        try:
-            with sqlite3.connect(db_path) as conn:
-                c = conn.cursor()
-                c.execute(f"""
-                    SELECT w.word FROM words w
-                    JOIN user_words uw ON w.id = uw.word_id
-                    WHERE uw.chat_id = ? {time_condition}
-                """, (chat_id, *time_params))
-                result = c.fetchall()
-                if result:
-                    words = [row[0] for row in result]
-                    return words
-                else:
-                    logger.warning(f"No responsible words found for chat ID {chat_id}.")
-                    return []
-        except sqlite3.Error as e:
-            logger.error(f"Database error getting responsible words ({chat_id}): {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Error while getting responsible words ({chat_id}): {e}")
+def _days_condition(days: list) -> tuple[str, list[str]]:
+    if not days:
+        return "AND 0", []
+    ranges = []
+    params = []
+    for day in sorted(set(days)):
+        ranges.append("uw.created_at >= ? AND uw.created_at < ?")
+        params += [_timestamp(day), _timestamp(day + timedelta(days=1))]
+    return f"AND ({' OR '.join(ranges)})", params
+
+def responsible_words(chat_id: int, today=None, limit: int = DUE_WORDS_LIMIT) -> list[str]:
+    """Returns the words to review today: the ones already reviewed today, then the due ones, most overdue first.
+
+    A review moves a word's next_due past today, so the reviewed ones are kept in the list by their
+    last_reviewed date until the day is over. At most `limit` words are returned, the overdue
+    words left out stay due and come up once the earlier ones are reviewed.
+    """
+    today = (today or datetime.now(timezone.utc).date()).isoformat()
+    try:
+        # two index range searches, an OR of both conditions would make SQLite scan all of the user's words
+        result = fetch_all("""
+            SELECT word FROM (
+                SELECT w.word, 0 AS later, uw.next_due FROM words w
+                JOIN user_words uw ON w.id = uw.word_id
+                WHERE uw.chat_id = ? AND uw.last_reviewed = ?
+                UNION ALL
+                SELECT w.word, 1, uw.next_due FROM words w
+                JOIN user_words uw ON w.id = uw.word_id
+                WHERE uw.chat_id = ? AND uw.next_due <= ? AND uw.last_reviewed IS NOT ?
+            )
+            ORDER BY later, next_due
+            LIMIT ?
+        """, (chat_id, today, chat_id, today, today, limit))
+        if result:
+            words = [row[0] for row in result]
+            return words
+        else:
+            logger.warning(f"No responsible words found for chat ID {chat_id}.")
             return []
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting responsible words ({chat_id}): {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error while getting responsible words ({chat_id}): {e}")
+        return []
+
+def iter_responsible_words(today=None, limit: int = DUE_WORDS_LIMIT):
+    """Streams (chat_id, [words]) for every user with words due today, from a single query.
+
+    Every user becomes one range search on idx_user_words_chat_due, which also returns
+    the rows grouped by chat_id and most overdue first, so each user's list is cut at `limit`.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    try:
+        rows = fetch_iter("""
+            SELECT c.chat_id, w.word FROM chat_ids c
+            JOIN user_words uw ON uw.chat_id = c.chat_id AND uw.next_due <= ?
+            JOIN words w ON w.id = uw.word_id
+            ORDER BY c.chat_id, uw.next_due
+        """, (today.isoformat(),))
+        for chat_id, group in groupby(rows, key=lambda row: row[0]):
+            yield chat_id, [row[1] for row in islice(group, limit)]
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting responsible words of all users: {e}")
 
 def specific_time_word(chat_id: int, date: list[int] = 'today') -> list[str]:
     now = datetime.now(timezone.utc)
@@ -302,37 +591,285 @@ def specific_time_word(chat_id: int, date: list[int] = 'today') -> list[str]:
         else:
             start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
         time_condition = "AND uw.created_at >= ?"
-        time_params = [start_of_day]
+        time_params = [_timestamp(start_of_day)]
     elif date == 'this_week':
         start_time = now - timedelta(days=7)
         time_condition = "AND uw.created_at >= ?"
-        time_params = [start_time]
+        time_params = [_timestamp(start_time)]
     else:
-        time_params = [(now - timedelta(days=dt)).date() for dt in date] # date day ago
-    placeholders = ', '.join(['?'] * len(time_params))
-    time_condition = f"AND DATE(uw.created_at) IN ({placeholders})"
+        time_condition, time_params = _days_condition([(now - timedelta(days=dt)).date() for dt in date]) # date day ago
 
-    with db_lock:
-        try:
-            with sqlite3.connect(db_path) as conn:
-                c = conn.cursor()
-                c.execute(f"""
-                    SELECT w.word FROM words w
-                    JOIN user_words uw ON w.id = uw.word_id
-                    WHERE uw.chat_id = ? {time_condition}
-                """, (chat_id, *time_params))
-                result = c.fetchall()
-                if result:
-                    words = [row[0] for row in result]
-                    logger.info(f"Retrieved specific_time_word words for chat ID {chat_id}.")
-                    return words
-                else:
-                    logger.warning(f"No specific_time_word words found for chat ID {chat_id}.")
-                    return []
-        except sqlite3.Error as e:
-            logger.error(f"Database error getting specific_time_word words ({chat_id}): {e}")
-            return []
-        except Exception as e:
-            logger.error(f"Error while getting specific_time_word words ({chat_id}): {e}")
+    try:
+        result = fetch_all(f"""
+            SELECT w.word FROM words w
+            JOIN user_words uw ON w.id = uw.word_id
+            WHERE uw.chat_id = ? {time_condition}
+        """, (chat_id, *time_params))
+        if result:
+            words = [row[0] for row in result]
+            logger.info(f"Retrieved specific_time_word words for chat ID {chat_id}.")
+            return words
+        else:
+            logger.warning(f"No specific_time_word words found for chat ID {chat_id}.")
             return []
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting specific_time_word words ({chat_id}): {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error while getting specific_time_word words ({chat_id}): {e}")
+        return []
+
+def get_user_words(chat_id: int, since: datetime = None) -> list[str]:
+    time_condition = "AND uw.created_at >= ?" if since else ""
+    time_params = [_timestamp(since)] if since else []
+    try:
+        result = fetch_all(f"""
+            SELECT w.word FROM words w
+            JOIN user_words uw ON w.id = uw.word_id
+            WHERE uw.chat_id = ? {time_condition}
+        """, (chat_id, *time_params))
+        return [row[0] for row in result]
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting user words ({chat_id}): {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Error while getting user words ({chat_id}): {e}")
+        return []
+
+def delete_user_word(chat_id: int, wrd: str) -> bool:
+    try:
+        with transaction() as c:
+            rows = c.execute("""SELECT id, created_at FROM user_words WHERE chat_id = ? AND word_id IN (SELECT id FROM words WHERE word = ?)""", (chat_id, wrd)).fetchall()
+            for row_id, created_at in rows:
+                c.execute("""DELETE FROM user_words WHERE id = ?""", (row_id,))
+                _uncount_word(c, chat_id, created_at[:10])
+        return len(rows) > 0
+    except sqlite3.Error as e:
+        logger.error(f"Database error deleting word ({chat_id}, {wrd}): {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Error deleting word ({chat_id}, {wrd}): {e}")
+        return False
 
+
+# --- Voice Files ---
+# Telegram file_ids of uploaded voices, keyed by 'word:<audio key>' or 'essay:<audio key>' (see bot.utils), so the
+# same audio is never synthesized or uploaded twice.
+def get_voice_file_id(file_key: str) -> str:
+    try:
+        result = fetch_one("""SELECT file_id FROM voice_files WHERE file_key = ?""", (file_key,))
+        return result[0] if result else None
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting voice file ID ({file_key}): {e}")
+        return None
+
+def save_voice_file_id(file_key: str, file_id: str) -> None:
+    try:
+        execute("""INSERT INTO voice_files (file_key, file_id) VALUES (?, ?)
+                   ON CONFLICT (file_key) DO UPDATE SET file_id = excluded.file_id, created_at = CURRENT_TIMESTAMP""", (file_key, file_id))
+    except sqlite3.Error as e:
+        logger.error(f"Database error saving voice file ID ({file_key}): {e}")
+
+def forget_voice_file_id(file_key: str) -> None:
+    try:
+        execute("""DELETE FROM voice_files WHERE file_key = ?""", (file_key,))
+    except sqlite3.Error as e:
+        logger.error(f"Database error deleting voice file ID ({file_key}): {e}")
+
+
+# --- Essay Cache ---
+# Generated essays keyed by a hash of their normalized words and options (see theAI), so the same
+# request is only sent to the LLM once per ESSAY_CACHE_TTL_HOURS. At most ESSAY_CACHE_MAX_ENTRIES
+# rows are kept, the least recently used go first. ESSAY_CACHE_MAX_ENTRIES = 0 disables the cache.
+def get_cached_essay(cache_key: str) -> str:
+    if ESSAY_CACHE_MAX_ENTRIES <= 0:
+        return None
+    try:
+        result = fetch_one('''SELECT essay, seconds FROM essay_cache WHERE cache_key = ? AND created_at >= datetime('now', ?)''',
+                           (cache_key, f'-{ESSAY_CACHE_TTL_HOURS} hours'))
+        if result:
+            execute('''UPDATE essay_cache SET used_at = CURRENT_TIMESTAMP WHERE cache_key = ?''', (cache_key,))
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting cached essay ({cache_key}): {e}")
+        result = None
+    with essay_cache_lock:
+        essay_cache_stats['hits' if result else 'misses'] += 1
+        if result:
+            essay_cache_stats['saved_seconds'] += result[1]
+    if result:
+        logger.info(f"Essay cache hit, saved {result[1]:.1f} seconds of generation. Essay cache: {get_essay_cache_stats()}")
+        return result[0]
+    return None
+
+def save_cached_essay(cache_key: str, essay: str, seconds: float) -> None:
+    if ESSAY_CACHE_MAX_ENTRIES <= 0:
+        return
+    try:
+        with transaction() as c:
+            c.execute('''INSERT OR REPLACE INTO essay_cache (cache_key, essay, seconds) VALUES (?, ?, ?)''', (cache_key, essay, seconds))
+            c.execute('''DELETE FROM essay_cache WHERE created_at < datetime('now', ?)''', (f'-{ESSAY_CACHE_TTL_HOURS} hours',))
+            c.execute('''DELETE FROM essay_cache WHERE cache_key IN (
+                            SELECT cache_key FROM essay_cache ORDER BY used_at DESC, rowid DESC LIMIT -1 OFFSET ?)''', (ESSAY_CACHE_MAX_ENTRIES,))
+    except sqlite3.Error as e:
+        logger.error(f"Database error caching essay ({cache_key}): {e}")
+
+def get_essay_cache_stats() -> dict:
+    with essay_cache_lock:
+        lookups = essay_cache_stats['hits'] + essay_cache_stats['misses']
+        return {
+            'hits': essay_cache_stats['hits'],
+            'misses': essay_cache_stats['misses'],
+            'hit_rate': round(essay_cache_stats['hits'] / lookups, 3) if lookups else 0.0,
+            'saved_seconds': round(essay_cache_stats['saved_seconds'], 1),
+        }
+
+
+# --- Review Schedule ---
+DEFAULT_REMINDERS = (0, 1, 3, 6, 14)
+MIN_REMINDERS = 2
+MAX_REMINDERS = 20
+
+def _day(created_at: str):
+    return datetime.strptime(created_at[:10], '%Y-%m-%d').date()
+
+def _reminder_offsets(c, chat_id: int) -> list[int]:
+    rows = c.execute("""SELECT days FROM reminder_intervals WHERE chat_id = ? ORDER BY position""", (chat_id,)).fetchall()
+    return [row[0] for row in rows] if rows else list(DEFAULT_REMINDERS)
+
+def _insert_reminders(c, chat_id: int, reminders) -> None:
+    c.executemany("""INSERT INTO reminder_intervals (chat_id, position, days) VALUES (?, ?, ?)""",
+                  [(chat_id, position, days) for position, days in enumerate(sorted(set(reminders)))])
+
+def _review_rows(c, chat_id: int, rows, quality: int, today) -> int:
+    offsets = _reminder_offsets(c, chat_id)
+    for row_id, created_at, step, ease, interval, repetitions, next_due in rows:
+        current = srs.Schedule(step, ease, interval, repetitions, next_due)
+        schedule = srs.review(current, quality, _day(created_at), today, offsets)
+        c.execute('''UPDATE user_words SET step = ?, ease = ?, interval_days = ?, repetitions = ?, next_due = ?, last_reviewed = ? WHERE id = ?''',
+                  (*schedule[:4], schedule.next_due.isoformat(), today.isoformat(), row_id))
+    return len(rows)
+
+def record_reviews(chat_id: int, wrds: list[str], quality: int = SM2_PASSIVE_QUALITY, today=None) -> int:
+    """Grades the due words among `wrds` (e.g. the ones in a delivered essay) and returns how many were rescheduled."""
+    today = today or datetime.now(timezone.utc).date()
+    if not wrds:
+        return 0
+    try:
+        with transaction() as c:
+            rows = c.execute(f'''
+                SELECT uw.id, uw.created_at, uw.step, uw.ease, uw.interval_days, uw.repetitions, uw.next_due
+                FROM user_words uw JOIN words w ON w.id = uw.word_id
+                WHERE uw.chat_id = ? AND uw.next_due <= ? AND w.word IN ({', '.join('?' * len(wrds))})
+            ''', (chat_id, today.isoformat(), *wrds)).fetchall()
+            return _review_rows(c, chat_id, rows, quality, today)
+    except sqlite3.Error as e:
+        logger.error(f"Database error recording reviews ({chat_id}): {e}")
+        return 0
+    except Exception as e:
+        logger.error(f"Error while recording reviews ({chat_id}): {e}")
+        return 0
+
+def review_word(chat_id: int, wrd: str, quality: int, today=None) -> bool:
+    """Grades a single word of the user, due or not."""
+    today = today or datetime.now(timezone.utc).date()
+    try:
+        with transaction() as c:
+            rows = c.execute('''
+                SELECT uw.id, uw.created_at, uw.step, uw.ease, uw.interval_days, uw.repetitions, uw.next_due
+                FROM user_words uw JOIN words w ON w.id = uw.word_id
+                WHERE uw.chat_id = ? AND w.word = ?
+            ''', (chat_id, wrd)).fetchall()
+            return _review_rows(c, chat_id, rows, quality, today) > 0
+    except sqlite3.Error as e:
+        logger.error(f"Database error reviewing a word ({chat_id}, {wrd}): {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Error while reviewing a word ({chat_id}, {wrd}): {e}")
+        return False
+
+
+# --- Stats ---
+# user_daily_counts and user_stats are kept up to date by match_user_with_word and
+# delete_user_word, so /stats reads one row instead of the user's whole history.
+def _count_word(c, chat_id: int, moved_from: str = None) -> None:
+    today = c.execute("SELECT date('now')").fetchone()[0]
+    c.execute('''INSERT INTO user_stats (chat_id) VALUES (?) ON CONFLICT (chat_id) DO NOTHING''', (chat_id,))
+    c.execute('''INSERT INTO user_daily_counts (chat_id, day, count) VALUES (?, ?, 1)
+                 ON CONFLICT (chat_id, day) DO UPDATE SET count = count + 1''', (chat_id, today))
+    if moved_from is None:
+        c.execute('''UPDATE user_stats SET total = total + 1 WHERE chat_id = ?''', (chat_id,))
+    elif _decrement_day(c, chat_id, moved_from):
+        _recompute_streaks(c, chat_id)
+        return
+
+    current, streak_end = c.execute('''SELECT current_streak, streak_end FROM user_stats WHERE chat_id = ?''', (chat_id,)).fetchone()
+    if streak_end == today:
+        return
+    yesterday = c.execute("SELECT date('now', '-1 day')").fetchone()[0]
+    current = current + 1 if streak_end == yesterday else 1
+    c.execute('''UPDATE user_stats SET current_streak = ?, streak_end = ?, longest_streak = MAX(longest_streak, ?)
+                 WHERE chat_id = ?''', (current, today, current, chat_id))
+
+def _uncount_word(c, chat_id: int, day: str) -> None:
+    c.execute('''UPDATE user_stats SET total = MAX(total - 1, 0) WHERE chat_id = ?''', (chat_id,))
+    if _decrement_day(c, chat_id, day):
+        _recompute_streaks(c, chat_id)
+
+def _decrement_day(c, chat_id: int, day: str) -> bool:
+    """Takes one word off a day and returns True when that day is left empty."""
+    c.execute('''UPDATE user_daily_counts SET count = count - 1 WHERE chat_id = ? AND day = ?''', (chat_id, day))
+    emptied = c.execute('''DELETE FROM user_daily_counts WHERE chat_id = ? AND day = ? AND count <= 0''', (chat_id, day))
+    return emptied.rowcount > 0
+
+def _recompute_streaks(c, chat_id: int) -> None:
+    days = [datetime.strptime(row[0], '%Y-%m-%d').date() for row in
+            c.execute('''SELECT day FROM user_daily_counts WHERE chat_id = ? ORDER BY day''', (chat_id,))]
+    current = 0
+    longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous and day - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    c.execute('''UPDATE user_stats SET current_streak = ?, streak_end = ?, longest_streak = ? WHERE chat_id = ?''',
+              (current, previous.isoformat() if previous else None, longest, chat_id))
+
+def _rebuild_user_stats(c, chat_id: int = None) -> None:
+    condition = "WHERE chat_id = ?" if chat_id is not None else ""
+    params = (chat_id,) if chat_id is not None else ()
+    c.execute(f'''DELETE FROM user_daily_counts {condition}''', params)
+    c.execute(f'''DELETE FROM user_stats {condition}''', params)
+    c.execute(f'''INSERT INTO user_daily_counts (chat_id, day, count)
+                  SELECT chat_id, date(created_at), COUNT(*) FROM user_words {condition} GROUP BY chat_id, date(created_at)''', params)
+    c.execute(f'''INSERT INTO user_stats (chat_id, total)
+                  SELECT chat_id, SUM(count) FROM user_daily_counts {condition} GROUP BY chat_id''', params)
+    for (stats_chat_id,) in c.execute(f'''SELECT chat_id FROM user_stats {condition}''', params).fetchall():
+        _recompute_streaks(c, stats_chat_id)
+    logger.info(f"Rebuilt stats for {'chat ID ' + str(chat_id) if chat_id is not None else 'all users'}.")
+
+def rebuild_user_stats(chat_id: int = None) -> bool:
+    """Backfills the stats tables from user_words, for one user or for everybody."""
+    try:
+        with transaction() as c:
+            _rebuild_user_stats(c, chat_id)
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Database error rebuilding stats ({chat_id}): {e}")
+        return False
+
+def get_user_stats(chat_id: int, start_of_day: datetime, start_week: datetime) -> dict:
+    """Returns total, today, this_week, streak and longest_streak of a user in one row read."""
+    try:
+        row = fetch_one('''
+            SELECT s.total,
+                   CASE WHEN s.streak_end = date('now') THEN s.current_streak ELSE 0 END,
+                   s.longest_streak,
+                   (SELECT COUNT(*) FROM user_words WHERE chat_id = s.chat_id AND created_at >= ?),
+                   (SELECT COUNT(*) FROM user_words WHERE chat_id = s.chat_id AND created_at >= ?)
+            FROM user_stats s WHERE s.chat_id = ?
+        ''', (_timestamp(start_of_day), _timestamp(start_week), chat_id))
+    except sqlite3.Error as e:
+        logger.error(f"Database error getting stats ({chat_id}): {e}")
+        return None
+    total, streak, longest, today, this_week = row if row else (0, 0, 0, 0, 0)
+    return {'total': total, 'today': today, 'this_week': this_week, 'streak': streak, 'longest_streak': longest}
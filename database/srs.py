@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+from typing import NamedTuple
+
+
+# A word first walks through the user's reminder cycle (the "learning" steps, offsets in days
+# from the day it was added). After the last step it graduates and is scheduled with SM-2.
+# A graduated word counts as past SM-2's fixed 1 and 6 day repetitions, so its next interval
+# grows from the gap between the last reminders instead of dropping back to 6 days.
+
+class Schedule(NamedTuple):
+    step: int
+    ease: float
+    interval: int
+    repetitions: int
+    next_due: date
+
+
+def first_due(added: date, offsets: list[int]) -> date:
+    return added + timedelta(days=offsets[0]) if offsets else added
+
+
+def initial_schedule(word_id: int, added: date, today: date, offsets: list[int]) -> Schedule:
+    """Places an existing word into the queue as if it had been reviewed on every reminder date."""
+    elapsed = (today - added).days
+    for step, offset in enumerate(offsets):
+        if offset >= elapsed:
+            return Schedule(step, 2.5, 0, 0, added + timedelta(days=offset))
+    interval = _graduation_interval(offsets)
+    # spread the old words over the coming interval instead of making them all due tomorrow
+    return Schedule(len(offsets), 2.5, interval, 2, today + timedelta(days=1 + word_id % interval))
+
+
+def review(current: Schedule, quality: int, added: date, today: date, offsets: list[int]) -> Schedule:
+    """Returns the schedule after a review graded 0 (blackout) to 5 (perfect)."""
+    step, ease, interval, repetitions, _ = current
+    ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    if step < len(offsets):
+        if quality < 3:
+            return Schedule(step, ease, interval, repetitions, today + timedelta(days=1))
+        step += 1
+        if step < len(offsets):
+            return Schedule(step, ease, interval, repetitions, max(added + timedelta(days=offsets[step]), today + timedelta(days=1)))
+        interval = _graduation_interval(offsets)
+        return Schedule(step, ease, interval, 2, today + timedelta(days=interval))
+
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+    else:
+        repetitions += 1
+        interval = 1 if repetitions == 1 else 6 if repetitions == 2 else round(interval * ease)
+    return Schedule(step, ease, interval, repetitions, today + timedelta(days=interval))
+
+
+def change_cycle(current: Schedule, added: date, today: date, old_offsets: list[int], new_offsets: list[int]) -> Schedule:
+    """Moves a word onto a new reminder cycle.
+
+    Graduated words keep their SM-2 schedule, a learning word goes to its step's date in the new
+    cycle, or graduates when the new cycle has no such step anymore.
+    """
+    step, ease, interval, repetitions, next_due = current
+    if step >= len(old_offsets):
+        return Schedule(len(new_offsets), ease, interval, repetitions, next_due)
+    if step < len(new_offsets):
+        return Schedule(step, ease, interval, repetitions, added + timedelta(days=new_offsets[step]))
+    interval = _graduation_interval(new_offsets)
+    return Schedule(len(new_offsets), ease, interval, 2, today + timedelta(days=interval))
+
+
+def _graduation_interval(offsets: list[int]) -> int:
+    if len(offsets) >= 2:
+        return max(offsets[-1] - offsets[-2], 1)
+    return max(offsets[-1], 1) if offsets else 1
@@ -1,5 +1,6 @@
 from bot.handlers import handle_message
 from database.databaseOps import init_db
+from database.connection import close_all_connections
 from telegram.ext import Updater, MessageHandler, Filters, CommandHandler
 import logging
 from config.settings import TELEGRAM_BOT_TOKEN, DAILY_ESSAYS_TIME, LOG_FILE_PATH
@@ -14,7 +15,7 @@ logger = logging.getLogger(__name__)
 
 from bot.handlers import (
     start, stop, delete_word, help_command, get_words_command,
-    stats_command, get_reminder_command, set_reminder_command,
+    stats_command, rebuild_stats_command, review_command, get_reminder_command, set_reminder_command,
     send_essay_to_user, turkish_meaning_command, define_command,
     pronounce_command, send_daily_essays, 
     test
@@ -46,6 +47,8 @@ def main() -> None:
     dispatcher.add_handler(CommandHandler("this_week", get_words_command))
     dispatcher.add_handler(CommandHandler("responsibility", get_words_command))
     dispatcher.add_handler(CommandHandler("stats", stats_command))
+    dispatcher.add_handler(CommandHandler("rebuild_stats", rebuild_stats_command))
+    dispatcher.add_handler(CommandHandler("review", review_command))
     
     dispatcher.add_handler(CommandHandler("reminder", get_reminder_command))
     dispatcher.add_handler(CommandHandler("set_reminders", set_reminder_command))
@@ -74,6 +77,7 @@ def main() -> None:
     toaster.show_toast("The Vocabulary Bot", "The Vocabulary Bot has just started!", duration=5, threaded=True)
 
     updater.idle()
+    close_all_connections()
     logger.info(f"Bot stopped.\n{'='*125}")
 
 if __name__ == '__main__':
@@ -85,10 +89,6 @@ if __name__ == '__main__':
     
     # TODO: Research what is inline mode and how to use it
     
-    # TODO: Asnc functions for scraping and ai operations
-    
-    # TODO: SM-2 (super memory algorithm) ?
-    
     # TODO: /generate_example command to generate an example sentence using a word
     # TODO: Add commands /synonyms [word] and /antonyms [word] (we can do it with theAI)
     
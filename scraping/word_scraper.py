@@ -1,7 +1,9 @@
-import requests
+import asyncio
+import httpx
+from urllib.parse import urlsplit
 from bs4 import BeautifulSoup as bs
-from config.settings import RETRY_DELAY, RETRY_LIMIT, LOG_FILE_PATH
-import time
+from config.settings import RETRY_DELAY, RETRY_LIMIT, LOG_FILE_PATH, SCRAPE_TIMEOUT, SCRAPE_MAX_CONNECTIONS, SCRAPE_PER_HOST_LIMIT
+from common import aio
 import logging
 
 logging.basicConfig(
@@ -11,11 +13,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-session = requests.Session()
 headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
     "Accept-Language": "en-US,en;q=0.9",
-    "Accept-Encoding": "gzip, deflate, br",
+    "Accept-Encoding": "gzip, deflate",
     "Connection": "keep-alive",
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
     "Upgrade-Insecure-Requests": "1",
@@ -25,50 +26,119 @@ headers = {
     "Sec-Fetch-User": "?1",
 }
 
-def scrape_the_word(wrd:str) -> tuple[list[str], list[str]]:
+
+class ScrapeError(Exception):
+    """Raised by the async API when a page could not be fetched at all."""
+
+
+# both are created on the background loop the first time they are needed
+_client = None
+_host_limits = {}
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=headers,
+            verify=False,
+            follow_redirects=True,
+            timeout=SCRAPE_TIMEOUT,
+            limits=httpx.Limits(max_connections=SCRAPE_MAX_CONNECTIONS, max_keepalive_connections=SCRAPE_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    if host not in _host_limits:
+        _host_limits[host] = asyncio.Semaphore(SCRAPE_PER_HOST_LIMIT)
+    return _host_limits[host]
+
+
+def _url_word(wrd: str) -> str:
     word = wrd.replace(' ', '-')
-    
-    word = word.strip().lower()
-    
-    url = f"https://dictionary.cambridge.org/dictionary/english/{word}"
+    return word.strip().lower()
+
+
+async def _fetch(url: str, word: str) -> bytes:
     for attempt in range(RETRY_LIMIT):
         try:
-            response = session.get(url, headers=headers, verify=False, timeout=20)
+            async with _host_limit(url):
+                response = await _get_client().get(url)
+            if response.status_code == 404:
+                return b''
             response.raise_for_status()
-            soup = bs(response.content, 'html.parser')
-            
-            definitions = [item.text.strip().strip(':') for item in soup.find_all('div', class_='def ddef_d db')]
-            examples = [item.text.strip() for item in soup.find_all('div', class_='examp dexamp')]            
-            return definitions, examples
-
+            return response.content
         except Exception as e:
             logger.error(f"Error occurred while scraping ({word}): {e}")
-            time.sleep(RETRY_DELAY)
             if attempt == RETRY_LIMIT - 1:
-                return [], []
-    return [], []
+                raise ScrapeError(f"Could not fetch {url}: {e}")
+            await asyncio.sleep(RETRY_DELAY * 2**attempt)
 
 
-def scrape_turkish_meaning(wrd:str) -> list[str]:
-    word = wrd.replace(' ', '-')
-    
-    word = word.strip().lower()
-    
-    url = f"https://dictionary.cambridge.org/dictionary/english-turkish/{word}"
-    
-    for attempt in range(RETRY_LIMIT):
-        try:
-            response = session.get(url, headers=headers, verify=False, timeout=20)
-            response.raise_for_status()
-            response.encoding = 'utf-8'
-            soup = bs(response.content, 'html.parser')
+# --- Async API ---
+def _parse_senses(soup) -> list[dict]:
+    senses = []
+    for block in soup.find_all('div', class_='def-block'):
+        definition = block.find('div', class_='ddef_d')
+        if definition is None:
+            continue
+        entry = block.find_parent('div', class_='entry-body__el')
+        pos = entry.find('span', class_='pos') if entry else None
+        level = block.find('span', class_='epp-xref')
+        senses.append({
+            'definition': definition.text.strip().strip(':'),
+            'pos': pos.text.strip() if pos else None,
+            'level': level.text.strip() if level else None,
+        })
+    if not senses: # page layout without def-blocks, keep the plain definitions
+        senses = [{'definition': item.text.strip().strip(':'), 'pos': None, 'level': None} for item in soup.find_all('div', class_='def ddef_d db')]
+    return senses
 
-            turkish_meanings = [item.text.strip() for item in soup.find_all('span', class_='trans dtrans dtrans-se')]
-            return turkish_meanings
 
-        except Exception as e:
-            logger.error(f"Error occurred while scraping ({word}): {e}")
-            time.sleep(RETRY_DELAY)
-            if attempt == RETRY_LIMIT - 1:
-                return []
-    return []
\ No newline at end of file
+# Parsing a page takes tens of milliseconds of CPU, so it runs in a worker thread (asyncio.to_thread)
+# instead of stalling the shared loop, where the other scrapes and the LLM streams are waiting.
+def _parse_the_senses(content: bytes) -> tuple[list[dict], list[str]]:
+    soup = bs(content, 'html.parser')
+    senses = _parse_senses(soup)
+    examples = [item.text.strip() for item in soup.find_all('div', class_='examp dexamp')]
+    return senses, examples
+
+
+def _parse_turkish_meanings(content: bytes) -> list[str]:
+    soup = bs(content, 'html.parser', from_encoding='utf-8')
+    return [item.text.strip() for item in soup.find_all('span', class_='trans dtrans dtrans-se')]
+
+
+async def fetch_the_senses(wrd: str) -> tuple[list[dict], list[str]]:
+    """Returns the senses of a word (definition, part of speech, CEFR level) and its examples."""
+    word = _url_word(wrd)
+    content = await _fetch(f"https://dictionary.cambridge.org/dictionary/english/{word}", word)
+    return await asyncio.to_thread(_parse_the_senses, content)
+
+
+async def fetch_the_word(wrd: str) -> tuple[list[str], list[str]]:
+    senses, examples = await fetch_the_senses(wrd)
+    return [sense['definition'] for sense in senses], examples
+
+
+async def fetch_turkish_meaning(wrd: str) -> list[str]:
+    word = _url_word(wrd)
+    content = await _fetch(f"https://dictionary.cambridge.org/dictionary/english-turkish/{word}", word)
+    return await asyncio.to_thread(_parse_turkish_meanings, content)
+
+
+# --- Sync wrappers ---
+def scrape_the_word(wrd: str) -> tuple[list[str], list[str]]:
+    try:
+        return aio.run(fetch_the_word(wrd))
+    except ScrapeError:
+        return [], []
+
+
+def scrape_turkish_meaning(wrd: str) -> list[str]:
+    try:
+        return aio.run(fetch_turkish_meaning(wrd))
+    except ScrapeError:
+        return []
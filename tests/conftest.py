@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+# config.settings reads the environment at import time, so it is prepared before any project module is imported
+_tmp = tempfile.mkdtemp(prefix="vocab-bot-tests-")
+os.environ.setdefault("AI_MODEL", "test-model")
+os.makedirs(os.path.join(_tmp, "logs"))
+os.environ["LOG_FILE_PATH"] = os.path.join(_tmp, "logs", "bot.log")
+os.environ["DB_PATH"] = os.path.join(_tmp, "default.db")
+os.environ["AUDIO_CACHE_DIR"] = os.path.join(_tmp, "audio_cache")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """Points the data-access layer at an empty database file, without initializing it."""
+    from database import connection, databaseOps
+    connection.close_connection()
+    monkeypatch.setattr(connection, 'db_path', str(tmp_path / 'test.db'))
+    monkeypatch.setattr(databaseOps, 'word_cache', databaseOps.LRUCache(databaseOps.WORD_CACHE_SIZE))
+    yield str(tmp_path / 'test.db')
+    connection.close_connection()
+
+
+@pytest.fixture
+def db(db_file):
+    """A freshly initialized database."""
+    from database import databaseOps
+    databaseOps.init_db()
+    return db_file
@@ -0,0 +1,46 @@
+import os
+
+from bot import audio_cache, tts, utils
+
+
+def test_voice_file_keys_change_with_backend_and_language(monkeypatch):
+    monkeypatch.setitem(tts.ROUTES, 'pronounce', 'gtts')
+    monkeypatch.setitem(tts.ROUTES, 'essay', 'gtts')
+    keys = {utils.pronunciation_key('cat'), utils.pronunciation_key('cat', slow=True), utils.pronunciation_key('cat', language='tr')}
+    essay = utils.essay_key('A **bold** essay.')
+
+    monkeypatch.setitem(tts.ROUTES, 'pronounce', 'espeak')
+    monkeypatch.setitem(tts.ROUTES, 'essay', 'espeak')
+    keys.add(utils.pronunciation_key('cat'))
+
+    assert len(keys) == 4
+    assert utils.essay_key('A **bold** essay.') != essay
+
+
+def test_audio_cache_evicts_the_least_recently_used_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_cache, 'AUDIO_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(audio_cache, 'AUDIO_CACHE_MAX_MB', 2500 / 1024 / 1024)
+    monkeypatch.setattr(audio_cache, '_size', None)
+    keys = [audio_cache.audio_key(f"word{i}", 'en', False) for i in range(4)]
+    for i, key in enumerate(keys[:3]):
+        audio_cache.put(key, b'x' * 800)
+        os.utime(audio_cache._path(key), (1000 + i, 1000 + i))
+
+    assert audio_cache.get(keys[0]) == b'x' * 800 # now the most recently used
+    audio_cache.put(keys[3], b'x' * 800) # 3200 bytes, evicts down to 2250
+
+    assert [audio_cache.contains(key) for key in keys] == [True, False, False, True]
+    assert audio_cache.get_stats()['size_mb'] == round(1600 / 1024 / 1024, 2)
+
+
+def test_audio_cache_size_leaves_out_files_being_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_cache, 'AUDIO_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(audio_cache, '_size', None)
+    key = audio_cache.audio_key("word", 'en', False)
+    os.makedirs(os.path.dirname(audio_cache._path(key)))
+    with open(f"{audio_cache._path(key)}.123.tmp", 'wb') as f: # another thread's put in progress
+        f.write(b'x' * 5000)
+
+    audio_cache.put(audio_cache.audio_key("other", 'en', False), b'x' * 800)
+
+    assert audio_cache._size == 800
@@ -0,0 +1,37 @@
+from bot.cohorts import Cohort, plan_cohorts
+
+
+def test_identical_word_sets_share_a_cohort():
+    cohorts = plan_cohorts([(1, ['b', 'a']), (2, ['a', 'b']), (3, ['c'])], min_jaccard=1, max_words=40)
+
+    assert cohorts == [Cohort([1, 2], ['a', 'b']), Cohort([3], ['c'])]
+
+
+def test_similar_word_sets_join_the_biggest_cohort():
+    common = [f'w{i}' for i in range(9)]
+    cohorts = plan_cohorts([
+        (1, common + ['x']),
+        (2, common + ['x']),
+        (3, common + ['y']), # jaccard 9/11 with the first set
+        (4, ['p', 'q']),
+    ], min_jaccard=0.8, max_words=40)
+
+    assert cohorts == [Cohort([1, 2, 3], sorted(common + ['x', 'y'])), Cohort([4], ['p', 'q'])]
+
+
+def test_dissimilar_word_sets_stay_apart():
+    cohorts = plan_cohorts([(1, ['a', 'b', 'c', 'd']), (2, ['a', 'b', 'c', 'e'])], min_jaccard=0.8, max_words=40)
+
+    assert [cohort.chat_ids for cohort in cohorts] == [[1], [2]] # jaccard 3/5
+
+
+def test_cohorts_stay_within_max_words():
+    common = [f'w{i}' for i in range(9)]
+    cohorts = plan_cohorts([(1, common + ['x']), (2, common + ['y'])], min_jaccard=0.8, max_words=10)
+
+    assert [cohort.chat_ids for cohort in cohorts] == [[1], [2]]
+
+
+def test_chats_without_words_are_left_out():
+    assert plan_cohorts([(1, []), (2, ['a'])], min_jaccard=0.8, max_words=40) == [Cohort([2], ['a'])]
+    assert plan_cohorts([], min_jaccard=0.8, max_words=40) == []
@@ -0,0 +1,133 @@
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest, Unauthorized
+
+from bot import handlers, utils
+
+CUT_OFF = "\n\n(The essay was cut off. Please try again later.)"
+FAILED = "Failed to generate an essay. Please try again later."
+
+
+class FakeChat:
+    """Stands in for update.message and context.bot, Telegram refuses Markdown with an odd number of '*'."""
+
+    def __init__(self, blocked=False):
+        self.messages = {} # message_id -> (text, parse_mode)
+        self.blocked = blocked
+        self.update = SimpleNamespace(effective_chat=SimpleNamespace(id=1), message=self)
+        self.context = SimpleNamespace(bot=self)
+
+    def _check(self, text, parse_mode):
+        if parse_mode is not None and text.count('*') % 2 == 1:
+            raise BadRequest("Can't parse entities: can't find end of the entity")
+
+    def reply_text(self, text, parse_mode=None):
+        self._check(text, parse_mode)
+        message_id = len(self.messages) + 1
+        self.messages[message_id] = (text, parse_mode)
+        return SimpleNamespace(message_id=message_id)
+
+    def edit_message_text(self, chat_id, message_id, text, parse_mode=None):
+        if self.blocked:
+            raise Unauthorized("Forbidden: bot was blocked by the user")
+        self._check(text, parse_mode)
+        self.messages[message_id] = (text, parse_mode)
+        return SimpleNamespace(message_id=message_id)
+
+    def texts(self):
+        return [self.messages[message_id][0] for message_id in sorted(self.messages)]
+
+
+@pytest.fixture(autouse=True)
+def no_retries(monkeypatch):
+    # the real send_message_UPDATE and edit_message are used, none of these errors may be retried
+    monkeypatch.setattr(utils.time, 'sleep', lambda seconds: pytest.fail("a Telegram request was retried"))
+    monkeypatch.setattr(handlers, 'ESSAY_STREAM_EDIT_INTERVAL', 0)
+
+
+@pytest.fixture
+def chat():
+    return FakeChat()
+
+
+def stream(chat, pieces):
+    placeholder = utils.send_message_UPDATE(chat.update, "Generating essay...")
+    return handlers.stream_essay_UPDATE(chat.update, chat.context, placeholder, pieces)
+
+
+def failing(*pieces):
+    yield from pieces
+    raise RuntimeError("stream broke")
+
+
+def test_essay_parts_are_stable_while_the_text_grows():
+    text = " ".join(f"word{i}" for i in range(3000))
+
+    parts = handlers._essay_parts(text)
+
+    assert "".join(parts) == text
+    assert len(parts) > 1 and all(len(part) <= 4000 for part in parts)
+    # once the text is past the limit, the first part no longer changes
+    for end in range(4001, len(text), 997):
+        assert handlers._essay_parts(text[:end])[0] == parts[0]
+
+
+def test_essay_parts_cut_words_without_spaces():
+    assert handlers._essay_parts("x" * 9000) == ["x" * 4000, "x" * 4000, "x" * 1000]
+
+
+def test_streamed_essay_ends_up_with_markdown(chat):
+    assert stream(chat, iter(["A **bold** ", "story."])) == "A **bold** story."
+
+    assert chat.messages == {1: ("A **bold** story.", handlers.ParseMode.MARKDOWN)}
+
+
+def test_unbalanced_markdown_falls_back_to_plain_text(chat):
+    assert stream(chat, iter(["A *bold story."])) == "A *bold story."
+
+    assert chat.messages == {1: ("A *bold story.", None)}
+
+
+def test_overflow_with_unbalanced_markdown_is_sent_as_plain_text(chat, monkeypatch):
+    # no edits while streaming, so the second part is first sent by the Markdown pass
+    monkeypatch.setattr(handlers, 'ESSAY_STREAM_EDIT_INTERVAL', 3600)
+    essay = "word " * 900 + "a *bold end."
+
+    assert stream(chat, iter([essay])) == essay
+
+    assert len(chat.messages) == 2 and chat.messages[2] == (handlers._essay_parts(essay)[1], None)
+
+
+def test_essay_that_cannot_be_shown_is_not_returned():
+    chat = FakeChat(blocked=True)
+
+    assert stream(chat, iter(["A story."])) is None
+
+    assert chat.texts() == ["Generating essay..."]
+
+
+def test_long_essays_roll_over_to_new_messages(chat):
+    pieces = [f"word{i} " for i in range(1500)]
+
+    essay = stream(chat, iter(pieces))
+
+    assert "".join(chat.texts()) == essay and len(chat.messages) > 1
+
+
+def test_failure_before_any_text_shows_the_error(chat):
+    assert stream(chat, failing()) is None
+
+    assert chat.texts() == [FAILED]
+
+
+def test_failure_after_some_text_keeps_it_and_marks_it_cut_off(chat):
+    assert stream(chat, failing("Once upon ", "a time")) is None
+
+    assert chat.texts() == ["Once upon a time" + CUT_OFF]
+
+
+def test_failure_without_a_placeholder_sends_the_error(chat):
+    assert handlers.stream_essay_UPDATE(chat.update, chat.context, 'ERROR', failing()) is None
+
+    assert chat.texts() == [FAILED]
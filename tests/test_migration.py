@@ -0,0 +1,94 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from database import databaseOps
+from database.connection import fetch_all, fetch_one
+
+
+def create_baseline_schema(path, created_at):
+    """The tables as the first release of the bot created them, with one user and two words."""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE chat_ids (
+            chat_id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            username TEXT,
+            email TEXT DEFAULT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            first_reminder INTEGER DEFAULT 0,
+            second_reminder INTEGER DEFAULT 1,
+            third_reminder INTEGER DEFAULT 3,
+            fourth_reminder INTEGER DEFAULT 6,
+            fifth_reminder INTEGER DEFAULT 14,
+            english_level TEXT DEFAULT B2,
+            UNIQUE (chat_id) ON CONFLICT REPLACE
+        );
+        CREATE TABLE words (
+            id INTEGER PRIMARY KEY,
+            word TEXT,
+            definitions TEXT,
+            examples TEXT,
+            turkish_meaning TEXT DEFAULT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (word) ON CONFLICT REPLACE
+        );
+        CREATE TABLE user_words (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER,
+            word_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (chat_id) REFERENCES chat_ids (chat_id),
+            FOREIGN KEY (word_id) REFERENCES words (id),
+            UNIQUE (chat_id, word_id) ON CONFLICT REPLACE
+        );
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            message TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    conn.execute("INSERT INTO chat_ids (chat_id, first_name, first_reminder, second_reminder, third_reminder, fourth_reminder, fifth_reminder) VALUES (1, 'Ada', 0, 2, 5, 9, 20)")
+    conn.execute("INSERT INTO words (id, word, definitions, examples, turkish_meaning) VALUES (1, 'apple', 'a round fruit;;;a tech company', 'I ate an apple.', 'elma;;;elma ağacı')")
+    conn.execute("INSERT INTO words (id, word, definitions, examples) VALUES (2, 'pear', 'a sweet fruit', '')")
+    conn.executemany("INSERT INTO user_words (chat_id, word_id, created_at) VALUES (1, ?, ?)", [(1, created_at), (2, created_at)])
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_schema_is_migrated(db_file):
+    today = datetime.now(timezone.utc).date()
+    create_baseline_schema(db_file, f"{today.isoformat()} 08:00:00")
+
+    databaseOps.init_db()
+
+    apple = databaseOps.get_word_entry('apple')
+    assert apple.definitions == ['a round fruit', 'a tech company']
+    assert apple.examples == ['I ate an apple.']
+    assert apple.turkish == ['elma', 'elma ağacı']
+    pear = databaseOps.get_word_entry('pear')
+    assert (pear.definitions, pear.examples, pear.turkish) == (['a sweet fruit'], [], None)
+
+    assert databaseOps.get_reminder_cycle_of_a_user(1) == [0, 2, 5, 9, 20]
+
+    # both words were added today, so they are due for the first reminder right away
+    assert fetch_all("SELECT step, interval_days, repetitions, next_due FROM user_words ORDER BY word_id") == [(0, 0, 0, today.isoformat())] * 2
+    assert sorted(databaseOps.responsible_words(1, today=today)) == ['apple', 'pear']
+    assert databaseOps.responsible_words(1, today=today - timedelta(days=1)) == []
+
+    indexes = {row[0] for row in fetch_all("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'user_words'")}
+    assert {'idx_user_words_chat_created', 'idx_user_words_chat_due', 'idx_user_words_chat_reviewed'} <= indexes
+    assert fetch_one("SELECT total FROM user_stats WHERE chat_id = 1") == (2,)
+
+
+def test_migration_runs_once(db_file):
+    today = datetime.now(timezone.utc).date()
+    create_baseline_schema(db_file, f"{today.isoformat()} 08:00:00")
+    databaseOps.init_db()
+    databaseOps.change_reminder_cycle_of_a_user(1, [0, 4])
+
+    databaseOps.init_db()
+
+    assert databaseOps.get_reminder_cycle_of_a_user(1) == [0, 4]
+    assert databaseOps.get_word_entry('apple').definitions == ['a round fruit', 'a tech company']
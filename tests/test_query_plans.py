@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database import connection, databaseOps
+
+
+@pytest.fixture
+def plans(db, monkeypatch):
+    """Records the reads of the databaseOps functions and returns EXPLAIN QUERY PLAN of each."""
+    queries = []
+    for name in ('fetch_all', 'fetch_iter'):
+        real = getattr(databaseOps, name)
+        def recording(query, params=(), real=real):
+            queries.append((query, params))
+            return real(query, params)
+        monkeypatch.setattr(databaseOps, name, recording)
+
+    def explain(call):
+        queries.clear()
+        result = call()
+        if result is not None and not isinstance(result, (list, dict)):
+            list(result) # generators only run their query when consumed
+        return [' | '.join(row[-1] for row in connection.fetch_all(f"EXPLAIN QUERY PLAN {query}", params)) for query, params in queries]
+    return explain
+
+
+def assert_uses(plan_list, index, column):
+    assert plan_list, "no query was run"
+    for plan in plan_list:
+        assert index in plan, plan
+        assert column in plan, plan
+
+
+def test_responsible_words_uses_due_and_reviewed_indexes(plans):
+    plan_list = plans(lambda: databaseOps.responsible_words(1))
+    assert_uses(plan_list, 'idx_user_words_chat_due', 'next_due<')
+    assert_uses(plan_list, 'idx_user_words_chat_reviewed', 'last_reviewed=')
+
+
+def test_iter_responsible_words_uses_due_index(plans):
+    assert_uses(plans(lambda: databaseOps.iter_responsible_words()), 'idx_user_words_chat_due', 'next_due<')
+
+
+@pytest.mark.parametrize('date', ['today', 'this_week', [0, 3]])
+def test_specific_time_word_uses_created_index(plans, date):
+    assert_uses(plans(lambda: databaseOps.specific_time_word(1, date=date)), 'idx_user_words_chat_created', 'created_at>')
+
+
+def test_get_user_words_since_uses_created_index(plans):
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+    assert_uses(plans(lambda: databaseOps.get_user_words(1, since=since)), 'idx_user_words_chat_created', 'created_at>')
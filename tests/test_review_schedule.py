@@ -0,0 +1,155 @@
+from datetime import date, timedelta
+
+from database import databaseOps, srs
+from database.connection import execute, fetch_one
+
+TODAY = date(2026, 3, 10)
+CHAT_ID = 1
+
+
+def add_words(chat_id, words, added=TODAY, next_due=None):
+    """Stores `words` for the user as if they were added on `added`, due on `next_due` (default: `added`)."""
+    execute("INSERT OR IGNORE INTO chat_ids (chat_id) VALUES (?)", (chat_id,))
+    for wrd in words:
+        execute("INSERT OR IGNORE INTO words (word, entry) VALUES (?, ?)", (wrd, '{"senses":[],"examples":[]}'))
+        word_id = fetch_one("SELECT id FROM words WHERE word = ?", (wrd,))[0]
+        execute("INSERT INTO user_words (chat_id, word_id, created_at, next_due) VALUES (?, ?, ?, ?)",
+                (chat_id, word_id, f"{added.isoformat()} 08:00:00", (next_due or added).isoformat()))
+
+
+def schedule_of(chat_id, wrd):
+    return fetch_one("""SELECT uw.step, uw.interval_days, uw.repetitions, uw.next_due, uw.last_reviewed
+                        FROM user_words uw JOIN words w ON w.id = uw.word_id WHERE uw.chat_id = ? AND w.word = ?""", (chat_id, wrd))
+
+
+def test_reviewed_words_stay_responsible_for_the_rest_of_the_day(db):
+    add_words(CHAT_ID, ['apple', 'pear'])
+    add_words(CHAT_ID, ['plum'], next_due=TODAY + timedelta(days=2))
+
+    assert databaseOps.record_reviews(CHAT_ID, ['apple', 'pear'], today=TODAY) == 2
+    assert schedule_of(CHAT_ID, 'apple')[3] > TODAY.isoformat()
+
+    assert sorted(databaseOps.responsible_words(CHAT_ID, today=TODAY)) == ['apple', 'pear']
+    # the daily job only picks words that are still due
+    assert list(databaseOps.iter_responsible_words(today=TODAY)) == []
+
+
+def test_overdue_words_are_capped_most_overdue_first(db):
+    words = [f'word{i:02}' for i in range(12)]
+    for days_overdue, wrd in enumerate(words):
+        add_words(CHAT_ID, [wrd], added=TODAY - timedelta(days=30), next_due=TODAY - timedelta(days=days_overdue))
+
+    expected = list(reversed(words))[:5]
+    assert databaseOps.responsible_words(CHAT_ID, today=TODAY, limit=5) == expected
+    assert list(databaseOps.iter_responsible_words(today=TODAY, limit=5)) == [(CHAT_ID, expected)]
+
+
+def test_reviewed_words_come_before_due_ones_within_the_cap(db):
+    add_words(CHAT_ID, ['reviewed'])
+    databaseOps.record_reviews(CHAT_ID, ['reviewed'], today=TODAY)
+    add_words(CHAT_ID, ['due1', 'due2'], next_due=TODAY - timedelta(days=1))
+
+    assert databaseOps.responsible_words(CHAT_ID, today=TODAY, limit=2) == ['reviewed', 'due1']
+
+
+def test_words_reviewed_on_an_earlier_day_are_not_responsible(db):
+    added = TODAY - timedelta(days=3)
+    add_words(CHAT_ID, ['apple'], added=added)
+    databaseOps.record_reviews(CHAT_ID, ['apple'], today=added)
+    databaseOps.record_reviews(CHAT_ID, ['apple'], today=added + timedelta(days=1))
+    assert schedule_of(CHAT_ID, 'apple')[3] == (added + timedelta(days=3)).isoformat() # third reminder
+
+    assert databaseOps.responsible_words(CHAT_ID, today=added + timedelta(days=2)) == []
+    assert databaseOps.responsible_words(CHAT_ID, today=added + timedelta(days=3)) == ['apple']
+
+
+def test_shrinking_the_cycle_graduates_words_past_its_end(db):
+    added = TODAY - timedelta(days=6)
+    add_words(CHAT_ID, ['early'], added=TODAY) # step 0
+    add_words(CHAT_ID, ['late'], added=added, next_due=added + timedelta(days=6))
+    execute("UPDATE user_words SET step = 3 WHERE word_id = (SELECT id FROM words WHERE word = 'late')") # fourth reminder (6 days)
+
+    assert databaseOps.change_reminder_cycle_of_a_user(CHAT_ID, [0, 2], today=TODAY)
+
+    assert schedule_of(CHAT_ID, 'early')[:4] == (0, 0, 0, TODAY.isoformat())
+    step, interval, repetitions, next_due, _ = schedule_of(CHAT_ID, 'late')
+    assert (step, interval, repetitions) == (2, 2, 2) # graduated with the last gap of the new cycle
+    assert next_due == (TODAY + timedelta(days=2)).isoformat()
+
+
+def test_growing_the_cycle_keeps_graduated_words_in_sm2(db):
+    added = TODAY - timedelta(days=40)
+    add_words(CHAT_ID, ['learning'], added=TODAY - timedelta(days=1), next_due=TODAY)
+    execute("UPDATE user_words SET step = 1 WHERE word_id = (SELECT id FROM words WHERE word = 'learning')")
+    add_words(CHAT_ID, ['graduated'], added=added, next_due=TODAY + timedelta(days=9))
+    execute("""UPDATE user_words SET step = 5, interval_days = 20, repetitions = 3
+               WHERE word_id = (SELECT id FROM words WHERE word = 'graduated')""")
+
+    assert databaseOps.change_reminder_cycle_of_a_user(CHAT_ID, [0, 2, 4, 8, 16, 32, 64], today=TODAY)
+
+    assert schedule_of(CHAT_ID, 'graduated')[:4] == (7, 20, 3, (TODAY + timedelta(days=9)).isoformat())
+    assert schedule_of(CHAT_ID, 'learning')[:4] == (1, 0, 0, (TODAY + timedelta(days=1)).isoformat()) # added + 2 days
+
+    # a review of the graduated word goes on with SM-2 instead of the new learning steps
+    databaseOps.review_word(CHAT_ID, 'graduated', 5, today=TODAY + timedelta(days=9))
+    step, interval, repetitions, _, _ = schedule_of(CHAT_ID, 'graduated')
+    assert (step, repetitions) == (7, 4) and interval > 20
+
+
+def test_review_word_walks_the_learning_steps_then_sm2(db):
+    add_words(CHAT_ID, ['apple'])
+    assert databaseOps.change_reminder_cycle_of_a_user(CHAT_ID, [0, 1], today=TODAY)
+
+    assert databaseOps.review_word(CHAT_ID, 'apple', 4, today=TODAY)
+    assert schedule_of(CHAT_ID, 'apple') == (1, 0, 0, (TODAY + timedelta(days=1)).isoformat(), TODAY.isoformat())
+    databaseOps.review_word(CHAT_ID, 'apple', 4, today=TODAY + timedelta(days=1))
+    assert schedule_of(CHAT_ID, 'apple')[:4] == (2, 1, 2, (TODAY + timedelta(days=2)).isoformat()) # graduated
+    databaseOps.review_word(CHAT_ID, 'apple', 5, today=TODAY + timedelta(days=2))
+    assert schedule_of(CHAT_ID, 'apple')[:4] == (2, 3, 3, (TODAY + timedelta(days=5)).isoformat()) # 1 * ease 2.6
+
+    # a lapse starts the SM-2 repetitions over
+    databaseOps.review_word(CHAT_ID, 'apple', 2, today=TODAY + timedelta(days=5))
+    assert schedule_of(CHAT_ID, 'apple')[:4] == (2, 1, 0, (TODAY + timedelta(days=6)).isoformat())
+    assert fetch_one("SELECT ease FROM user_words")[0] < 2.6
+    databaseOps.review_word(CHAT_ID, 'apple', 4, today=TODAY + timedelta(days=6))
+    databaseOps.review_word(CHAT_ID, 'apple', 4, today=TODAY + timedelta(days=7))
+    assert schedule_of(CHAT_ID, 'apple')[:4] == (2, 6, 2, (TODAY + timedelta(days=13)).isoformat())
+
+    assert not databaseOps.review_word(CHAT_ID, 'unknown', 4, today=TODAY)
+
+
+def test_failed_learning_review_repeats_the_step_tomorrow(db):
+    add_words(CHAT_ID, ['apple'])
+
+    databaseOps.review_word(CHAT_ID, 'apple', 1, today=TODAY)
+
+    assert schedule_of(CHAT_ID, 'apple')[:4] == (0, 0, 0, (TODAY + timedelta(days=1)).isoformat())
+
+
+def test_record_reviews_only_grades_the_due_words(db):
+    add_words(CHAT_ID, ['due', 'other'])
+    add_words(CHAT_ID, ['later'], next_due=TODAY + timedelta(days=2))
+    add_words(2, ['due'])
+
+    assert databaseOps.record_reviews(CHAT_ID, ['due', 'later', 'missing'], today=TODAY) == 1
+
+    assert schedule_of(CHAT_ID, 'due')[0] == 1
+    assert schedule_of(CHAT_ID, 'later')[0::3] == (0, (TODAY + timedelta(days=2)).isoformat())
+    assert schedule_of(CHAT_ID, 'other')[0] == 0
+    assert schedule_of(2, 'due')[0] == 0 # another user's copy of the word
+    assert databaseOps.record_reviews(CHAT_ID, [], today=TODAY) == 0
+
+
+def test_first_interval_after_graduation_does_not_shrink():
+    offsets = [0, 1, 3, 7, 30, 60]
+    schedule = srs.Schedule(0, 2.5, 0, 0, TODAY)
+    while schedule.step < len(offsets):
+        schedule = srs.review(schedule, 4, TODAY, schedule.next_due, offsets)
+    assert schedule.interval == 30
+
+    after = srs.review(schedule, 4, TODAY, schedule.next_due, offsets)
+    assert after.interval >= 30
+
+    moved = srs.change_cycle(srs.Schedule(5, 2.5, 0, 0, TODAY), TODAY, TODAY, offsets, offsets[:5])
+    assert moved.interval == 23
+    assert srs.review(moved, 4, TODAY, moved.next_due, offsets[:5]).interval >= 23